@@ -1,11 +1,19 @@
-from typing import Annotated
+import asyncio
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+import functools
+import logging
+from typing import Annotated, Callable
 import networkx as nx
-from fastapi import FastAPI, Body, HTTPException, Query, Response, status
+from fastapi import FastAPI, Body, Header, HTTPException, Query, Response, status
 from pydantic import BaseModel
 from plot import PlotterType, get_plotter
 from model import Track
-from solver import SingleTrackOptimizerType, SingleTrackSolution, get_single_track_optimizer
+from solver import WARM_START_OPTIMIZER_TYPES, IncrementalTrackModel, SingleTrackOptimizerType, SingleTrackSolution, SolverBackendType, extend_tree, get_single_track_optimizer, prune_tree
 
+from network_index import get_network_index
+from reduction import reduced_network_adapter_factory, sparsified_network_adapter_factory
 from sample import load_network
 from fastapi import Body
 from fastapi.responses import JSONResponse
@@ -17,11 +25,62 @@ import os
 tracks: dict[str, Track] = {}
 # This will be our in-memory cache. TODO: Use a real database
 topologies: dict[str, SingleTrackSolution] = {}
+# Incremented whenever the forwarding table of the track changes, so that the relays know when to fetch it again
+topology_versions: defaultdict[str, int] = defaultdict(int)
+# The ILP models of the tracks, kept between subscriptions, so that they don't have to be rebuilt from scratch
+models: dict[str, IncrementalTrackModel] = {}
+# The tracks waiting for their topology to be refined in the background, along with the options of the optimization.
+# A track is only queued once at a time, and its refinement optimizes the subscribers it has when the refinement starts.
+refinement_queue: asyncio.Queue[str] | None = None
+pending_refinements: dict[str, dict] = {}
+# Subscriptions to the same track are serialized by its lock (the ones to different tracks are optimized in parallel).
+# The subscribers waiting for the lock are pending, and all of them join in a single optimization once one of them gets
+# it, after which they are ongoing until the optimization is done.
+track_locks: defaultdict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+pending_joins: dict[str, dict[str, asyncio.Future]] = {}
+ongoing_joins: dict[str, dict[str, asyncio.Future]] = {}
+
+# The optimizations (and the plots) are CPU-bound, so they are run by a pool of worker processes instead of on the
+# event loop. At most MAX_CONCURRENT_OPTIMIZATIONS of them are submitted at a time, the rest wait for their turn
+# (without blocking the cheap endpoints).
+OPTIMIZATION_WORKERS = int(os.getenv("OPTIMIZATION_WORKERS", os.cpu_count() or 1))
+MAX_CONCURRENT_OPTIMIZATIONS = int(os.getenv("MAX_CONCURRENT_OPTIMIZATIONS", OPTIMIZATION_WORKERS))
+executor: ProcessPoolExecutor | None = None
+optimization_slots: asyncio.Semaphore | None = None
+
+# The refinements only have to improve on the topologies that are already served, so unless their requests say
+# otherwise, they start from the heuristic and stop at a time limit (or once they are close enough to the optimum),
+# so that a slow track doesn't hold up the refinements of the others for as long as its ILP takes
+REFINEMENT_TIME_LIMIT = float(os.getenv("REFINEMENT_TIME_LIMIT", 30))
+REFINEMENT_GAP = float(os.getenv("REFINEMENT_GAP", 0.01))
+
+logger = logging.getLogger(__name__)
 
 topo = os.path.join("datasource", os.getenv("TOPOFILE", "azure_geant_topo.yaml"))
 network = load_network(topo)
-
-app = FastAPI()
+# The relays are referred to by their (1-based) position among the nodes of the network at the /origin endpoints
+relay_names: dict[int, str] = dict(enumerate(network.nodes, start=1))
+relay_ids: dict[str, int] = {node: relay_id for relay_id, node in relay_names.items()}
+# The shortest latencies between all the nodes are computed up front, so that the subscriptions that can never be
+# served within the delay budget of their track are rejected right away (instead of after an optimization)
+get_network_index(network).latency_shortest_paths
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    global refinement_queue, executor, optimization_slots
+    refinement_queue = asyncio.Queue()
+    optimization_slots = asyncio.Semaphore(MAX_CONCURRENT_OPTIMIZATIONS)
+    # As many tracks are refined at a time as there are slots for their optimizations
+    workers = [asyncio.create_task(refine_topologies()) for _ in range(MAX_CONCURRENT_OPTIMIZATIONS)]
+    yield
+    for worker in workers:
+        worker.cancel()
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+        executor = None
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 class NodeDTO(BaseModel):
@@ -48,11 +107,22 @@ class SingleTrackSolutionDTO(BaseModel):
     cost: float
     max_delay: float
     used_links: list[tuple[str, str]]
+    gap: float | None = None
     
 class Origin(BaseModel):
     url: str
 
 
+class ForwardingEntryDTO(BaseModel):
+    upstream: str | None
+    downstream: list[int]
+
+
+class ForwardingTableDTO(BaseModel):
+    version: int
+    relays: dict[int, ForwardingEntryDTO]
+
+
 def get_track_namespace(track_namespace: str) -> str:
     return f"{track_namespace}"
 
@@ -71,8 +141,17 @@ async def get_tracks() -> list[TrackDTO]:
 
 @app.post("/tracks/{track_namespace}", status_code=status.HTTP_201_CREATED)
 async def create_track(track_namespace: str, track_dto: Annotated[TrackDTO, Body()]) -> TrackDTO | None:
-    track = Track(track_dto.publisher, [], track_dto.delay_budget)
-    tracks[track_namespace] = track
+    # The publisher is looked up in the network by the subscriptions (and in the forwarding table), so it has to be a relay
+    if track_dto.publisher not in network.nodes:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No such relay: {track_dto.publisher}")
+
+    async with track_locks[track_namespace]:
+        track = Track(track_dto.publisher, [], track_dto.delay_budget)
+        tracks[track_namespace] = track
+        models.pop(track_namespace, None)
+        # The table of the new track starts from its own publisher, so it changes even if there was no topology yet
+        topologies.pop(track_namespace, None)
+        topology_versions[track_namespace] += 1
     return track_dto
 
 
@@ -91,7 +170,37 @@ async def get_topology_for_track(track_namespace: str) -> SingleTrackSolutionDTO
     if solution is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Track namespace not found")
-    return SingleTrackSolutionDTO(cost=solution.cost, max_delay=solution.max_delay, used_links=solution.used_links)
+    return SingleTrackSolutionDTO(cost=solution.cost, max_delay=solution.max_delay, used_links=solution.used_links,
+                                  gap=solution.gap)
+
+
+# The whole forwarding table of the track, i.e., the URL of the upstream relay of every relay in the topology (none for
+# the publisher), along with the ids of its downstream relays. The version of the table is also sent as its ETag,
+# so a relay can revalidate its cached copy with If-None-Match.
+@app.get("/tracks/{track_namespace}/forwarding-table", status_code=status.HTTP_200_OK)
+async def get_forwarding_table(track_namespace: str,
+                               if_none_match: Annotated[str | None, Header()] = None) -> ForwardingTableDTO:
+    track = tracks.get(track_namespace, None)
+    if track is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Track namespace not found")
+
+    version = topology_versions[track_namespace]
+    etag = f'"{version}"'
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    relays = {relay_ids[track.publisher]: ForwardingEntryDTO(upstream=None, downstream=[])}
+    solution = topologies.get(track_namespace, None)
+    if solution is not None:
+        for node, upstream in solution.forwarding_table.items():
+            relays.setdefault(relay_ids[node], ForwardingEntryDTO(upstream=None, downstream=[])).upstream = \
+                relay_url(relay_ids[upstream])
+            relays.setdefault(relay_ids[upstream], ForwardingEntryDTO(upstream=None, downstream=[])).downstream.append(
+                relay_ids[node])
+
+    response = ForwardingTableDTO(version=version, relays=relays)
+    return JSONResponse(content=response.model_dump(), headers={"ETag": etag})
 
 
 @app.get("/tracks/{track_namespace}/topology/plot", status_code=status.HTTP_200_OK)
@@ -102,94 +211,409 @@ async def get_topology_plot(track_namespace: str, plotter_type: Annotated[Plotte
             status_code=status.HTTP_404_NOT_FOUND, detail="Track namespace not found")
 
     used_links = (await get_topology_for_track(track_namespace)).used_links
-    plotter = get_plotter(plotter_type)
-    image_bytes = plotter(network, {track.publisher, *track.subscribers}, set(network.edges), set(used_links), "red")
+    image_bytes = await run_in_worker(plot, plotter_type, {track.publisher, *track.subscribers}, used_links)
     return Response(content=image_bytes, media_type="image/png")
 
 
-def optimize(network: nx.DiGraph, track: Track,
-             optimizer_type: SingleTrackOptimizerType = SingleTrackOptimizerType.INTEGER_LINEAR_PROGRAMMING,
-             reduce_network: bool = False) -> SingleTrackSolution:
+# Runs a function in the process pool (which is created on first use), once there's a free slot for it
+async def run_in_worker(function, *args, **kwargs):
+    global executor
+    if executor is None:
+        executor = ProcessPoolExecutor(max_workers=OPTIMIZATION_WORKERS)
+
+    async with get_optimization_slots():
+        return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(function, *args, **kwargs))
+
+
+# Same as run_in_worker, but for the functions that have to work on the state of this process (i.e., the persistent
+# ILP models), which are run by a thread instead (their solvers are separate processes anyway, in case of CBC)
+async def run_in_thread(function, *args, **kwargs):
+    async with get_optimization_slots():
+        return await asyncio.to_thread(function, *args, **kwargs)
+
+
+def get_optimization_slots() -> asyncio.Semaphore:
+    global optimization_slots
+    if optimization_slots is None:
+        optimization_slots = asyncio.Semaphore(MAX_CONCURRENT_OPTIMIZATIONS)
+    return optimization_slots
+
+
+# Functions to be run by the workers, each of which has its own copy of the network (loaded when the module is imported)
+def plot(plotter_type: PlotterType, nodes: set[str], used_links: list[tuple[str, str]]) -> bytes:
+    return get_plotter(plotter_type)(network, nodes, set(network.edges), set(used_links), "red")
+
+
+def optimize_on_network(track: Track, **options) -> SingleTrackSolution:
+    return optimize(network, track, **options)
+
+
+def optimize(network: nx.DiGraph, track: Track, **options) -> SingleTrackSolution:
+    return get_optimizer(**options)(network, track)
+
+
+# Raises a ValueError if the options don't make up a valid optimizer
+def get_optimizer(optimizer_type: SingleTrackOptimizerType = SingleTrackOptimizerType.INTEGER_LINEAR_PROGRAMMING,
+                  reduce_network: bool = False,
+                  warm_start: SingleTrackOptimizerType | None = None,
+                  time_limit: float | None = None,
+                  gap: float | None = None,
+                  backend: SolverBackendType | None = None,
+                  nearest_links: int | None = None) -> Callable[[nx.DiGraph, Track], SingleTrackSolution]:
+    optimizer = get_single_track_optimizer(optimizer_type, warm_start=warm_start, time_limit=time_limit, gap=gap,
+                                           backend=backend)
+    if nearest_links is not None:
+        optimizer = sparsified_network_adapter_factory(optimizer, nearest_links)
     if reduce_network:
-        network = network.copy()
-        network.remove_nodes_from(
-            {track.publisher, *track.subscribers} - {*network.nodes})
-    optimizer = get_single_track_optimizer(optimizer_type)
-    return optimizer(network, track)
+        optimizer = reduced_network_adapter_factory(optimizer)
+    return optimizer
+
+
+# The joins of a batch are optimized with the options of one of them, so the options of every join are checked before
+# it's added to the batch, so that invalid ones don't fail the others as well
+def validate_options(incremental: bool = False, anytime: bool = False, **options):
+    try:
+        get_optimizer(**options)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+# Re-solves the ILP of the track with its persistent model, which only has to be updated with the streams of the
+# subscribers that joined or left since the last solve
+def optimize_with_model(track_namespace: str, track: Track,
+                        warm_start: SingleTrackOptimizerType | None = None,
+                        time_limit: float | None = None,
+                        gap: float | None = None,
+                        backend: SolverBackendType | None = None) -> SingleTrackSolution:
+    if warm_start not in (None, *WARM_START_OPTIMIZER_TYPES):
+        raise ValueError("An ILP can only be warm started by a heuristic.")
+
+    model = models.get(track_namespace, None)
+    if model is None or model.backend != backend:
+        model = IncrementalTrackModel(network, track, backend)
+        models[track_namespace] = model
+    else:
+        model.sync(track)
+
+    # The model only needs an explicit incumbent for its first solve, after that it keeps its own
+    incumbent = None
+    if model.solution is None and warm_start is not None:
+        incumbent = get_single_track_optimizer(warm_start)(network, track)
+    return model.solve(incumbent, time_limit, gap)
+
+
+# Queues the track for a re-optimization in the background (unless it's already waiting for one)
+def schedule_refinement(track_namespace: str,
+                        warm_start: SingleTrackOptimizerType | None = None,
+                        time_limit: float | None = None,
+                        gap: float | None = None,
+                        **options):
+    if track_namespace not in pending_refinements:
+        refinement_queue.put_nowait(track_namespace)
+    pending_refinements[track_namespace] = dict(
+        options,
+        warm_start=SingleTrackOptimizerType.MULTICAST_HEURISTIC if warm_start is None else warm_start,
+        time_limit=REFINEMENT_TIME_LIMIT if time_limit is None else time_limit,
+        gap=REFINEMENT_GAP if gap is None else gap)
+
+
+# Re-optimizes the queued tracks one after the other, off the event loop (several of these run side by side)
+async def refine_topologies():
+    while True:
+        track_namespace = await refinement_queue.get()
+        options = pending_refinements.pop(track_namespace)
+
+        track = tracks.get(track_namespace, None)
+        if track is not None and track.subscribers:
+            snapshot = Track(track.publisher, sorted(track.subscribers), track.delay_budget)
+            try:
+                solution = await run_in_worker(optimize_on_network, snapshot, **options)
+            except Exception:
+                logger.exception("Refining the topology of %s has failed", track_namespace)
+            else:
+                replace_topology_if_cheaper(track_namespace, track, snapshot, solution)
+
+        refinement_queue.task_done()
+
+
+# The topology is only replaced if the track still has the same subscribers as the snapshot it was optimized for.
+# There's no await in between the check and the replacement, so no request can change the track in the meantime.
+def replace_topology_if_cheaper(track_namespace: str, track: Track, snapshot: Track, solution: SingleTrackSolution) -> bool:
+    if tracks.get(track_namespace, None) is not track or track.subscribers != snapshot.subscribers:
+        return False
+
+    current_solution = topologies.get(track_namespace, None)
+    if not solution.success or (current_solution is not None and solution.cost >= current_solution.cost):
+        return False
+
+    store_topology(track_namespace, solution)
+    return True
 
 
 @app.post("/tracks/{track_namespace}/subscription/{subscriber}", status_code=status.HTTP_200_OK)
 async def subscribe_to_track(track_namespace: str, subscriber: str,
                              optimizer_type: Annotated[SingleTrackOptimizerType | None, Query(
                              )] = SingleTrackOptimizerType.INTEGER_LINEAR_PROGRAMMING,
-                             reduce_network: Annotated[bool | None, Query()] = False) -> str:
+                             reduce_network: Annotated[bool | None, Query()] = False,
+                             incremental: Annotated[bool | None, Query()] = False,
+                             warm_start: Annotated[SingleTrackOptimizerType | None, Query()] = None,
+                             time_limit: Annotated[float | None, Query(gt=0)] = None,
+                             gap: Annotated[float | None, Query(ge=0)] = None,
+                             backend: Annotated[SolverBackendType | None, Query()] = None,
+                             nearest_links: Annotated[int | None, Query(gt=0)] = None,
+                             anytime: Annotated[bool | None, Query()] = False) -> str:
+    await subscribe_all(track_namespace, [subscriber], optimizer_type=optimizer_type, reduce_network=reduce_network,
+                        incremental=incremental, warm_start=warm_start, time_limit=time_limit, gap=gap, backend=backend,
+                        nearest_links=nearest_links, anytime=anytime)
+    return get_next_hop(track_namespace, subscriber)
+
+
+# Subscribes every relay of the list to the track with a single optimization, and returns the next hop of each of them
+@app.post("/tracks/{track_namespace}/subscriptions", status_code=status.HTTP_200_OK)
+async def subscribe_all_to_track(track_namespace: str, subscribers: Annotated[list[str], Body()],
+                                 optimizer_type: Annotated[SingleTrackOptimizerType | None, Query(
+                                 )] = SingleTrackOptimizerType.INTEGER_LINEAR_PROGRAMMING,
+                                 reduce_network: Annotated[bool | None, Query()] = False,
+                                 incremental: Annotated[bool | None, Query()] = False,
+                                 warm_start: Annotated[SingleTrackOptimizerType | None, Query()] = None,
+                                 time_limit: Annotated[float | None, Query(gt=0)] = None,
+                                 gap: Annotated[float | None, Query(ge=0)] = None,
+                                 backend: Annotated[SolverBackendType | None, Query()] = None,
+                                 nearest_links: Annotated[int | None, Query(gt=0)] = None,
+                                 anytime: Annotated[bool | None, Query()] = False) -> dict[str, str]:
+    subscribers = list(dict.fromkeys(subscribers))
+    await subscribe_all(track_namespace, subscribers, optimizer_type=optimizer_type, reduce_network=reduce_network,
+                        incremental=incremental, warm_start=warm_start, time_limit=time_limit, gap=gap, backend=backend,
+                        nearest_links=nearest_links, anytime=anytime)
+    return {subscriber: get_next_hop(track_namespace, subscriber) for subscriber in subscribers}
+
+
+# Makes sure that every one of the subscribers has joined the track. Either all the new ones can join, or none of them
+# is even tried (e.g., if one of them cannot be reached within the delay budget).
+async def subscribe_all(track_namespace: str, subscribers: list[str], **options):
     track = tracks.get(track_namespace, None)
     if track is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Track namespace not found")
 
     # Memoization of used links per track
-    if subscriber not in track.subscribers:
-        track.add_subscriber(subscriber)
-
-        solution = optimize(network, track, optimizer_type, reduce_network)
-        if not solution.success:
-            raise HTTPException(
-                status_code=status.HTTP_406_NOT_ACCEPTABLE, detail="Optimization failed")
-
-        topologies[track_namespace] = solution
-
-    next_hop = next(map(lambda edge: edge[0], filter(
-        lambda edge, subscriber=subscriber: edge[1] == subscriber, topologies[track_namespace].used_links)), None)
-    if next_hop == None:
+    joins, new_subscribers = [], []
+    for subscriber in subscribers:
+        join = pending_joins.get(track_namespace, {}).get(subscriber, None) or \
+            ongoing_joins.get(track_namespace, {}).get(subscriber, None)
+        if join is not None:
+            joins.append(join)
+        elif subscriber not in track.subscribers:
+            if subscriber not in network.nodes:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No such relay: {subscriber}")
+            if not get_network_index(network).is_reachable_in_time(track.publisher, subscriber, track.delay_budget):
+                raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE,
+                                    detail=f"Subscriber cannot be reached within the delay budget: {subscriber}")
+            new_subscribers.append(subscriber)
+
+    # The joins wait for the track to be free, and whoever gets it first optimizes for all the joins waiting by then
+    if new_subscribers:
+        validate_options(**options)
+        new_joins = [asyncio.get_running_loop().create_future() for _ in new_subscribers]
+        pending_joins.setdefault(track_namespace, {}).update(zip(new_subscribers, new_joins))
+        joins.extend(new_joins)
+        try:
+            async with track_locks[track_namespace]:
+                # The new joins were added at once, so they are all in the same batch
+                if not new_joins[0].done():
+                    await join_track(track_namespace, **options)
+        except asyncio.CancelledError:
+            withdraw_joins(track_namespace, dict(zip(new_subscribers, new_joins)))
+            raise
+
+    # Identical requests that come while the subscribers are joining share the outcome of the joins. The outcome of
+    # every join is retrieved (even if an earlier one has failed already), and the joins are shielded, so that they
+    # are not cancelled for the other requests waiting for them if this one is cancelled.
+    outcomes = await asyncio.shield(asyncio.gather(*joins, return_exceptions=True))
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            raise outcome
+
+
+# The joins of a request cancelled while waiting for the track would stay pending forever (nobody else optimizes them,
+# and identical requests wait for them instead of for the lock), so they are cancelled and forgotten. The ones that
+# are already being optimized by another request are left alone.
+def withdraw_joins(track_namespace: str, joins: dict[str, asyncio.Future]):
+    waiting_joins = pending_joins.get(track_namespace, {})
+    for subscriber, join in joins.items():
+        if waiting_joins.get(subscriber, None) is join:
+            del waiting_joins[subscriber]
+            join.cancel()
+    if not waiting_joins:
+        pending_joins.pop(track_namespace, None)
+
+
+# Caches the topology of the track, with its forwarding table built up front, so that the next hops of its subscribers
+# are simple lookups
+def store_topology(track_namespace: str, solution: SingleTrackSolution):
+    previous_solution = topologies.get(track_namespace, None)
+    if previous_solution is None or solution.forwarding_table != previous_solution.forwarding_table:
+        topology_versions[track_namespace] += 1
+    topologies[track_namespace] = solution
+
+
+def delete_topology(track_namespace: str):
+    if topologies.pop(track_namespace, None) is not None:
+        topology_versions[track_namespace] += 1
+
+
+def relay_url(relay_id: int) -> str:
+    return f"https://10.3.0.{relay_id}:4443/"
+
+
+def get_next_hop(track_namespace: str, subscriber: str) -> str:
+    solution = topologies.get(track_namespace, None)
+    next_hop = solution.forwarding_table.get(subscriber, None) if solution is not None else None
+    if next_hop is None:
         raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE,
                             detail="Next hop cannot be determined")
     return next_hop
 
 
-@app.delete("/tracks/{track_namespace}/subscription/{subscriber}", status_code=status.HTTP_204_NO_CONTENT)
-async def unsubscribe_to_track(track_namespace: str, subscriber: str):
-    track = tracks.get(track_namespace, None)
-    if track is None:
+# Adds the subscribers waiting to join the track, and optimizes its topology once for all of them (with the options
+# of the request that got to do it). Their joins are resolved with the outcome, i.e., they either all succeed,
+# or all fail with the same error.
+async def join_track(track_namespace: str, **options):
+    # The track might have been recreated while waiting for the lock
+    track = tracks[track_namespace]
+    joins = pending_joins.pop(track_namespace)
+    ongoing_joins[track_namespace] = joins
+    try:
+        store_topology(track_namespace, await optimize_joins(track_namespace, track, list(joins), **options))
+    except Exception as e:
+        for join in joins.values():
+            join.set_exception(e)
+    except BaseException:
+        for join in joins.values():
+            join.cancel()
+        raise
+    else:
+        for join in joins.values():
+            join.set_result(None)
+    finally:
+        del ongoing_joins[track_namespace]
+
+
+async def optimize_joins(track_namespace: str, track: Track, subscribers: list[str],
+                         optimizer_type: SingleTrackOptimizerType = SingleTrackOptimizerType.INTEGER_LINEAR_PROGRAMMING,
+                         reduce_network: bool = False,
+                         incremental: bool = False,
+                         warm_start: SingleTrackOptimizerType | None = None,
+                         time_limit: float | None = None,
+                         gap: float | None = None,
+                         backend: SolverBackendType | None = None,
+                         nearest_links: int | None = None,
+                         anytime: bool = False) -> SingleTrackSolution:
+    for subscriber in subscribers:
+        track.add_subscriber(subscriber)
+
+    # The subscribers only stay on the track if they have a topology, otherwise a retry would find them already
+    # subscribed, and wouldn't optimize again
+    try:
+        return await optimize_subscribed_joins(track_namespace, track, subscribers, optimizer_type, reduce_network,
+                                               incremental, warm_start, time_limit, gap, backend, nearest_links,
+                                               anytime)
+    except BaseException:
+        for subscriber in subscribers:
+            track.remove_subscriber(subscriber)
+        raise
+
+
+async def optimize_subscribed_joins(track_namespace: str, track: Track, subscribers: list[str],
+                                    optimizer_type: SingleTrackOptimizerType,
+                                    reduce_network: bool,
+                                    incremental: bool,
+                                    warm_start: SingleTrackOptimizerType | None,
+                                    time_limit: float | None,
+                                    gap: float | None,
+                                    backend: SolverBackendType | None,
+                                    nearest_links: int | None,
+                                    anytime: bool) -> SingleTrackSolution:
+    # Try to graft the new subscribers onto the cached topology first, and only fall back
+    # to optimizing the whole track if the delay budget cannot be met that way
+    solution = None
+    if incremental and track_namespace in topologies:
+        solution = topologies[track_namespace]
+        for subscriber in subscribers:
+            solution = extend_tree(network, track, solution, subscriber)
+            if not solution.success:
+                break
+    # In anytime mode, the answer comes from the heuristic, and the requested optimizer refines it later
+    if anytime and (solution is None or not solution.success):
+        solution = optimize(network, track, optimizer_type=SingleTrackOptimizerType.MULTICAST_HEURISTIC)
+    if solution is None or not solution.success:
+        try:
+            if optimizer_type == SingleTrackOptimizerType.INTEGER_LINEAR_PROGRAMMING and not reduce_network \
+                    and nearest_links is None:
+                solution = await run_in_thread(optimize_with_model, track_namespace, track, warm_start, time_limit,
+                                               gap, backend)
+            else:
+                solution = await run_in_worker(optimize_on_network, track, optimizer_type=optimizer_type,
+                                               reduce_network=reduce_network, warm_start=warm_start,
+                                               time_limit=time_limit, gap=gap, backend=backend,
+                                               nearest_links=nearest_links)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if not solution.success:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Track namespace not found")
-    if subscriber not in track.subscribers:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail="Relay is not in track namespace")
+            status_code=status.HTTP_406_NOT_ACCEPTABLE, detail="Optimization failed")
+
+    if anytime:
+        schedule_refinement(track_namespace, optimizer_type=optimizer_type, reduce_network=reduce_network,
+                            warm_start=warm_start, time_limit=time_limit, gap=gap, backend=backend,
+                            nearest_links=nearest_links)
+    return solution
 
-    track.remove_subscriber(subscriber)
+
+@app.delete("/tracks/{track_namespace}/subscription/{subscriber}", status_code=status.HTTP_204_NO_CONTENT)
+async def unsubscribe_to_track(track_namespace: str, subscriber: str,
+                               improve: Annotated[bool | None, Query()] = False):
+    async with track_locks[track_namespace]:
+        track = tracks.get(track_namespace, None)
+        if track is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Track namespace not found")
+        if subscriber not in track.subscribers:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                detail="Relay is not in track namespace")
+
+        track.remove_subscriber(subscriber)
+
+        # Prune the cached topology, so that we don't keep paying for links that no longer lead to any subscriber
+        solution = topologies.get(track_namespace, None)
+        if solution is not None:
+            if track.subscribers:
+                store_topology(track_namespace, prune_tree(network, track, solution, subscriber, improve))
+            else:
+                delete_topology(track_namespace)
+        if not track.subscribers:
+            models.pop(track_namespace, None)
 
 
 @app.get("/origin/{relay_id}/{namespace}")
 async def get_origin(relay_id: int, namespace: str):
-    nodes = network.nodes
-
-    if relay_id > len(nodes):
+    relay_in = relay_names.get(relay_id, None)
+    if relay_in is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No such relay")
-    relay_in = list(nodes)[relay_id - 1]
-    
-    response = await subscribe_to_track(track_namespace=namespace, subscriber=relay_in)
 
-    try:
-        relay_out_id = list(nodes).index(response) + 1
-    except ValueError:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No such relay")
-    
-    if response is not None:
-        response_json = {"url": f"https://10.3.0.{relay_out_id}:4443/"}
-        return JSONResponse(content=response_json, headers={"Cache-Control": "no-cache, no-store, must-revalidate"})
-    else:
-        raise HTTPException(status_code=response.status_code, detail=response.text)
+    # The relay is waiting for the answer, so it comes from the heuristic, and the topology is refined afterwards
+    next_hop = await subscribe_to_track(track_namespace=namespace, subscriber=relay_in, anytime=True)
+
+    response_json = {"url": relay_url(relay_ids[next_hop])}
+    return JSONResponse(content=response_json, headers={"Cache-Control": "no-cache, no-store, must-revalidate"})
 
 
 @app.post("/origin/{relay_id}/{namespace}", status_code=status.HTTP_200_OK)
 async def set_origin(relay_id: int, namespace: str, origin: Annotated[Origin, Body()]):
-    nodes = network.nodes
-
-    if relay_id > len(nodes):
+    relay = relay_names.get(relay_id, None)
+    if relay is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No such relay")
-    relay = list(nodes)[relay_id - 1]
-    
+
     delay_budget = float(namespace.split("_")[2]) if "_" in namespace else 0.0
 
     response = await create_track(
@@ -207,4 +631,7 @@ async def set_origin(relay_id: int, namespace: str, origin: Annotated[Origin, Bo
 
 @app.delete("/origin/{relayid}/{namespace}", status_code=status.HTTP_204_NO_CONTENT)
 async def del_origin(relayid: int, namespace: str, origin: Annotated[Origin, Body()]):
-    await unsubscribe_to_track(track_namespace=namespace, subscriber=relayid)
+    relay = relay_names.get(relayid, None)
+    if relay is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No such relay")
+    await unsubscribe_to_track(track_namespace=namespace, subscriber=relay)
@@ -1,10 +1,12 @@
+from argparse import ArgumentParser
 import os
 import sys
 from enum import Enum
 import time
 from typing import IO
+from reduction import reduced_network_adapter_factory, sparsified_network_adapter_factory
 from sample import load_network
-from solver import MultiTrackOptimizerType, MultiTrackSolution, SingleTrackOptimizerType, get_multi_track_optimizer, get_single_track_optimizer
+from solver import ILP_OPTIMIZER_TYPES, WARM_START_OPTIMIZER_TYPES, MultiTrackOptimizerType, MultiTrackSolution, SingleTrackOptimizerType, SolverBackendType, get_multi_track_optimizer, get_single_track_optimizer
 from traffic import choose_peers, generate_broadcast_traffic
 import signal
 
@@ -15,8 +17,14 @@ MAXIMUM_RUNTIME_IN_SECONDS = 2 * 3600  # 2 hours
 OPTIMIZER_ABBREVIATIONS = {
     SingleTrackOptimizerType.DIRECT_LINK_TREE: "DIR",
     SingleTrackOptimizerType.MULTICAST_HEURISTIC: "HEU",
+    SingleTrackOptimizerType.DELAY_CONSTRAINED_STEINER_TREE: "DCST",
+    SingleTrackOptimizerType.LAGRANGIAN_RELAXATION: "LARAC",
     SingleTrackOptimizerType.INTEGER_LINEAR_PROGRAMMING: "ILP",
-    SingleTrackOptimizerType.MINIMUM_SPANNING_TREE: "MST"
+    SingleTrackOptimizerType.COMPACT_INTEGER_LINEAR_PROGRAMMING: "CILP",
+    SingleTrackOptimizerType.SPARSE_INTEGER_LINEAR_PROGRAMMING: "SILP",
+    SingleTrackOptimizerType.MINIMUM_SPANNING_TREE: "MST",
+    SingleTrackOptimizerType.HIERARCHICAL: "HIER",
+    SingleTrackOptimizerType.PORTFOLIO: "PORT"
 }
 
 
@@ -40,7 +48,7 @@ def generate_content(track_id, publisher, subscribers, content_type):
     return tracks
 
 
-def benchmark(network, peers, min_peers, max_peers, step):
+def benchmark(network, peers, min_peers, max_peers, step, reduce_network=False, nearest_links=None, **optimizer_options):
     pid = os.getpid()
     with open(f"benchmark-{pid}-{time.strftime('%Y%m%d%H%M%S')}.csv", "wb", buffering=0) as file:
         store_header(file)
@@ -61,8 +69,18 @@ def benchmark(network, peers, min_peers, max_peers, step):
                     if single_track_optimizer_type in to_be_skipped:
                         continue
 
-                    single_track_optimizer = get_single_track_optimizer(
-                        single_track_optimizer_type)
+                    try:
+                        single_track_optimizer = get_single_track_optimizer(
+                            single_track_optimizer_type, **optimizer_options)
+                    except ValueError as e:
+                        # Some combinations of options are not supported by every optimizer
+                        to_be_skipped.add(single_track_optimizer_type)
+                        print(f"\tSkipping {single_track_optimizer_type.name}: {e}")
+                        continue
+                    if nearest_links is not None:
+                        single_track_optimizer = sparsified_network_adapter_factory(single_track_optimizer, nearest_links)
+                    if reduce_network:
+                        single_track_optimizer = reduced_network_adapter_factory(single_track_optimizer)
                     multi_track_optimizer = get_multi_track_optimizer(
                         MultiTrackOptimizerType.ADAPTED, single_track_optimizer=single_track_optimizer)
 
@@ -76,7 +94,8 @@ def benchmark(network, peers, min_peers, max_peers, step):
 
                     try:
                         runtime_in_ms, solution = collect_optimization_info(network, tracks, multi_track_optimizer)
-                        store_record(content_type, number_of_peers, single_track_optimizer_type, runtime_in_ms, solution, file)
+                        store_record(content_type, number_of_peers, single_track_optimizer_type, runtime_in_ms, solution, file,
+                                     optimizer_options.get("warm_start"), nearest_links)
                         print(f"\tOptimization completed")
                     except TimeoutError:
                         to_be_skipped.add(single_track_optimizer_type)
@@ -88,7 +107,7 @@ def benchmark(network, peers, min_peers, max_peers, step):
 
 
 def store_header(file: IO):
-    header = "content_type,number_of_peers,opt_type,runtime_in_ms,success,objective,max_delay\n"
+    header = "content_type,number_of_peers,opt_type,runtime_in_ms,success,objective,max_delay,gap,build_time_in_ms,solve_time_in_ms,nearest_links\n"
     file.write(header.encode("utf-8"))
 
 
@@ -97,12 +116,21 @@ def store_record(content_type: ContentType,
                  opt_type: SingleTrackOptimizerType | MultiTrackOptimizerType,
                  runtime_in_ms: float,
                  solution: MultiTrackSolution,
-                 file: IO):
+                 file: IO,
+                 warm_start: SingleTrackOptimizerType | None = None,
+                 nearest_links: int | None = None):
     opt_name = OPTIMIZER_ABBREVIATIONS[opt_type]
+    if warm_start is not None and opt_type in ILP_OPTIMIZER_TYPES:
+        opt_name += f"+{OPTIMIZER_ABBREVIATIONS[warm_start]}"
     success = "1" if solution.success else "0"
     cost = solution.cost
     max_delay = solution.max_delay if solution.success else LATENCIES[content_type]
-    record = (content_type.name, str(number_of_peers), opt_name, f"{runtime_in_ms:.4f}", success, f"{cost:.4f}", f"{max_delay:.4f}")
+    gap = f"{solution.gap:.4f}" if solution.gap is not None else ""
+    timings = solution.timings
+    build_time_in_ms = f"{timings['build'] * 1000:.4f}" if "build" in timings else ""
+    solve_time_in_ms = f"{timings['solve'] * 1000:.4f}" if "solve" in timings else ""
+    record = (content_type.name, str(number_of_peers), opt_name, f"{runtime_in_ms:.4f}", success, f"{cost:.4f}", f"{max_delay:.4f}", gap,
+              build_time_in_ms, solve_time_in_ms, str(nearest_links) if nearest_links is not None else "")
     record_line = ",".join(record) + "\n"
     file.write(record_line.encode("utf-8"))
 
@@ -118,6 +146,30 @@ def collect_optimization_info(network, tracks, multi_track_optimizer):
 
 
 if __name__ == "__main__":
+    parser = ArgumentParser(description="MoQ Relay Topology Optimization Benchmark")
+    parser.add_argument("--warm-start",
+                        choices=[opt.name for opt in WARM_START_OPTIMIZER_TYPES],
+                        default=None, help="Optimizer to warm start the ILPs with")
+    parser.add_argument("--time-limit", type=float, default=None,
+                        help="Time limit (in seconds) of a single ILP solve, after which the best solution found is used")
+    parser.add_argument("--gap", type=float, default=None,
+                        help="Relative optimality gap at which an ILP solve is stopped")
+    parser.add_argument("--backend", choices=[backend.name for backend in SolverBackendType], default=None,
+                        help="Solver backend of the (PuLP based) ILPs")
+    parser.add_argument("--reduce-network", action="store_true",
+                        help="Optimize every track on the part of the network that can be used within its delay budget")
+    parser.add_argument("--nearest-links", type=int, default=None,
+                        help="Number of cheapest and of closest outgoing links kept per node (all of them by default)")
+    args = parser.parse_args()
+    if args.nearest_links is not None and args.nearest_links < 1:
+        parser.error("--nearest-links must be positive")
+
+    optimizer_options = {"time_limit": args.time_limit, "gap": args.gap}
+    if args.backend is not None:
+        optimizer_options["backend"] = SolverBackendType[args.backend]
+    if args.warm_start is not None:
+        optimizer_options["warm_start"] = SingleTrackOptimizerType[args.warm_start]
+
     network = load_network("./datasource/azure_geant_topo.yaml")
     peers = choose_peers(network, network.number_of_nodes(), seed=42)
 
@@ -127,7 +179,7 @@ if __name__ == "__main__":
     
     for i in range(n):
         if (pid := os.fork()) == 0:
-            benchmark(network, peers, 2 + i, len(peers), n)
+            benchmark(network, peers, 2 + i, len(peers), n, args.reduce_network, args.nearest_links, **optimizer_options)
             sys.exit(0)
         elif pid > 0:
             pids.append(pid)
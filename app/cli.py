@@ -43,7 +43,8 @@ def write_to_cache(input_model_hash: str, used_links_per_track: dict[str, list[t
 def get_optimal_topology(network: nx.DiGraph, tracks: dict[str, Track], use_cache: bool = False,
                          single_track_optimizer_type: SingleTrackOptimizerType = SingleTrackOptimizerType.INTEGER_LINEAR_PROGRAMMING,
                          multi_track_optimizer_type: MultiTrackOptimizerType = MultiTrackOptimizerType.ADAPTED,
-                         debug: bool = False) -> dict[str, list[tuple[str, str]]]:
+                         debug: bool = False,
+                         max_workers: int | None = None) -> dict[str, list[tuple[str, str]]]:
     input_model_hash = hash_input_model(network, tracks)
 
     if use_cache and is_cached(input_model_hash):
@@ -63,7 +64,7 @@ def get_optimal_topology(network: nx.DiGraph, tracks: dict[str, Track], use_cach
         single_track_optimizer = get_single_track_optimizer(
             single_track_optimizer_type)
         multi_track_optimizer = get_multi_track_optimizer(
-            multi_track_optimizer_type, single_track_optimizer=single_track_optimizer)
+            multi_track_optimizer_type, single_track_optimizer=single_track_optimizer, max_workers=max_workers)
 
         success, objective, avg_delay, used_links_per_track = multi_track_optimizer(
             network, tracks)
@@ -112,6 +113,8 @@ if __name__ == "__main__":
                         help="Single track optimizer to use (ignored if multi-track optimizer is not set to ADAPTED)")
     parser.add_argument("--multi-track-optimizer",
                         choices=[opt.name for opt in MultiTrackOptimizerType], default=MultiTrackOptimizerType.ADAPTED.name, help="Multi track optimizer to use")
+    parser.add_argument("--max-workers", type=int, default=None,
+                        help="Number of processes to optimize the tracks with (only used if multi-track optimizer is set to PARALLEL)")
     parser.add_argument("--debug",
                         action="store_true", default=True, help="Debug mode")
     parser.add_argument("--plotter", choices=[opt.name for opt in PlotterType],
@@ -138,7 +141,8 @@ if __name__ == "__main__":
         network, tracks, args.use_cache,
         SingleTrackOptimizerType[args.single_track_optimizer],
         MultiTrackOptimizerType[args.multi_track_optimizer],
-        args.debug
+        args.debug,
+        args.max_workers
     )
     end = time.time()
 
@@ -0,0 +1,157 @@
+from dataclasses import dataclass
+
+import networkx as nx
+import numpy as np
+import pulp as lp
+import scipy.sparse as sp
+from scipy.optimize import Bounds, LinearConstraint, OptimizeResult, milp
+
+from model import Track
+from network_index import get_network_index
+
+
+# A MILP in the matrix form expected by scipy.optimize.milp:
+#   minimize c^T v subject to constraint_lower <= A v <= constraint_upper, variable_lower <= v <= variable_upper
+@dataclass
+class MilpModel:
+    c: np.ndarray
+    A: sp.csr_array
+    constraint_lower: np.ndarray
+    constraint_upper: np.ndarray
+    variable_lower: np.ndarray
+    variable_upper: np.ndarray
+    integrality: np.ndarray
+
+
+# The stream based formulation of the single track ILP (see solver.get_optimal_topology_for_a_single_track),
+# assembled from the edge arrays of the network index instead of one constraint at a time.
+# The variables are laid out as [x_{stream}_{link} (stream-major), y_{link}, z_{stream}_{link} (stream-major)],
+# and the links are indexed in the order of `network.edges`.
+def build_single_track_milp(network: nx.DiGraph, track: Track) -> MilpModel:
+    index = get_network_index(network)
+
+    number_of_streams = len(track.streams)
+    number_of_nodes = len(index.nodes)
+    number_of_links = index.number_of_edges
+    number_of_stream_links = number_of_streams * number_of_links
+
+    links = np.arange(number_of_links)
+    streams_identity = sp.identity(number_of_streams, format="csr")
+    stream_links_identity = sp.identity(number_of_stream_links, format="csr")
+    stream_links_zeros = sp.csr_array((number_of_stream_links, number_of_stream_links))
+
+    # Objective function: sum(cij * yij)
+    c = np.concatenate([np.zeros(number_of_stream_links), index.edge_costs, np.zeros(number_of_stream_links)])
+
+    # Constraint: yij - xfij >= 0
+    link_usage_rows = sp.hstack([
+        -stream_links_identity,
+        sp.vstack([sp.identity(number_of_links, format="csr")] * number_of_streams),
+        stream_links_zeros,
+    ])
+
+    # Constraint: sum(xfji) - sum(xfij) == Rfi, where the incidence matrix has a +1 at the target and a -1 at the
+    # source of every link
+    incidence = sp.csr_array(
+        (np.concatenate([np.ones(number_of_links), -np.ones(number_of_links)]),
+         (np.concatenate([index.edge_targets, index.edge_sources]), np.concatenate([links, links]))),
+        shape=(number_of_nodes, number_of_links))
+    nodal_balance_rows = sp.hstack([
+        sp.kron(streams_identity, incidence),
+        sp.csr_array((number_of_streams * number_of_nodes, number_of_links)),
+        sp.csr_array((number_of_streams * number_of_nodes, number_of_stream_links)),
+    ])
+    # Rfi is -1 at the publisher and 1 at the subscriber of the stream (and 0 at every other node of the network)
+    reliabilities = np.zeros(number_of_streams * number_of_nodes)
+    for i, stream in enumerate(track.streams.keys()):
+        reliabilities[i * number_of_nodes + index.node_ids[track.publisher]] = -1
+        reliabilities[i * number_of_nodes + index.node_ids[track.subscriber_of(stream)]] = 1
+
+    # Constraint: zfij - xfij >= 0
+    # Every stream carries a single unit, so (after cancelling the circulations) xfij <= 1, and M == 1 suffices
+    link_selection_rows = sp.hstack([
+        -stream_links_identity,
+        sp.csr_array((number_of_stream_links, number_of_links)),
+        stream_links_identity,
+    ])
+
+    # Constraint: sum(zfij * dij) <= D
+    delay_budget_rows = sp.hstack([
+        sp.csr_array((number_of_streams, number_of_stream_links)),
+        sp.csr_array((number_of_streams, number_of_links)),
+        sp.kron(streams_identity, sp.csr_array(index.edge_latencies.reshape(1, -1))),
+    ])
+
+    A = sp.vstack([link_usage_rows, nodal_balance_rows, link_selection_rows, delay_budget_rows], format="csr")
+    constraint_lower = np.concatenate([
+        np.zeros(number_of_stream_links),
+        reliabilities,
+        np.zeros(number_of_stream_links),
+        np.full(number_of_streams, -np.inf),
+    ])
+    constraint_upper = np.concatenate([
+        np.full(number_of_stream_links, np.inf),
+        reliabilities,
+        np.full(number_of_stream_links, np.inf),
+        np.full(number_of_streams, track.delay_budget),
+    ])
+
+    # xfij >= 0, yij >= 0 and zfij == 0 or 1
+    # Streams can't use the links that are too slow to be on any of the paths to their subscriber, so xfij == zfij == 0
+    usable_links = index.usable_links(track.publisher, [track.subscriber_of(stream) for stream in track.streams.keys()],
+                                      track.delay_budget).ravel()
+    variable_lower = np.zeros(2 * number_of_stream_links + number_of_links)
+    variable_upper = np.concatenate([np.where(usable_links, np.inf, 0.0),
+                                     np.full(number_of_links, np.inf),
+                                     usable_links.astype(np.float64)])
+    integrality = np.concatenate([np.zeros(number_of_stream_links + number_of_links, dtype=np.uint8),
+                                  np.ones(number_of_stream_links, dtype=np.uint8)])
+
+    return MilpModel(c, A, constraint_lower, constraint_upper, variable_lower, variable_upper, integrality)
+
+
+# Converts a PuLP problem (of minimization) into the matrix form, keeping its variables in the order of the columns
+def milp_from_problem(prob: lp.LpProblem) -> tuple[MilpModel, list[lp.LpVariable]]:
+    variables = prob.variables()
+    columns = {var.name: i for i, var in enumerate(variables)}
+
+    c = np.zeros(len(variables))
+    for var, coefficient in prob.objective.items():
+        c[columns[var.name]] = coefficient
+
+    rows, cols, data = [], [], []
+    constraint_lower = np.full(len(prob.constraints), -np.inf)
+    constraint_upper = np.full(len(prob.constraints), np.inf)
+    for i, constraint in enumerate(prob.constraints.values()):
+        for var, coefficient in constraint.items():
+            rows.append(i)
+            cols.append(columns[var.name])
+            data.append(coefficient)
+        # PuLP keeps the constraints in the form of "expression + constant <sense> 0"
+        if constraint.sense in (lp.LpConstraintGE, lp.LpConstraintEQ):
+            constraint_lower[i] = -constraint.constant
+        if constraint.sense in (lp.LpConstraintLE, lp.LpConstraintEQ):
+            constraint_upper[i] = -constraint.constant
+    A = sp.csr_array((data, (rows, cols)), shape=(len(prob.constraints), len(variables)))
+
+    variable_lower = np.array([-np.inf if var.lowBound is None else var.lowBound for var in variables], dtype=np.float64)
+    variable_upper = np.array([np.inf if var.upBound is None else var.upBound for var in variables], dtype=np.float64)
+    integrality = np.array([var.cat == lp.LpInteger for var in variables], dtype=np.uint8)
+
+    return MilpModel(c, A, constraint_lower, constraint_upper, variable_lower, variable_upper, integrality), variables
+
+
+# Solves the model with HiGHS, optionally stopping at a deadline (in seconds) or when the relative optimality gap
+# is small enough. The result contains a solution (`x`) if a feasible one was found, even if the search was stopped.
+def solve_milp(model: MilpModel, time_limit: float | None = None, gap: float | None = None) -> OptimizeResult:
+    options = {}
+    if time_limit is not None:
+        options["time_limit"] = time_limit
+    if gap is not None:
+        options["mip_rel_gap"] = gap
+
+    return milp(model.c,
+                constraints=LinearConstraint(model.A, model.constraint_lower, model.constraint_upper),
+                bounds=Bounds(model.variable_lower, model.variable_upper),
+                integrality=model.integrality,
+                options=options)
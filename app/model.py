@@ -180,7 +180,7 @@ class Track:
         if stream_id is None:
             stream_id = f"f{max(map(lambda sid: int(sid[1:]), self.streams.keys()), default=0) + 1}"
         self.streams[stream_id] = defaultdict(
-            lambda: 0,
+            int,
             {
                 self.publisher: -1,
                 subscriber: 1
@@ -195,6 +195,9 @@ class Track:
             if subscriber not in stream
         }
 
+    def subscriber_of(self, stream_id: str) -> str:
+        return next(node for node, reliability in self.streams[stream_id].items() if reliability == 1)
+
     def __iter__(self):
         yield from (self.publisher, self.subscribers)
 
@@ -0,0 +1,189 @@
+import functools
+import weakref
+
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import shortest_path
+
+
+# Latencies are sums of floats, so the same path might add up to slightly different values when summed in another order
+LATENCY_TOLERANCE = 1e-9
+
+
+class NetworkIndex:
+    # Array-based view of a network, so that the optimizers don't have to scan through (or look up) the
+    # edges of the graph one by one. Nodes are referred to by their position in `nodes`, and the in-edges of
+    # every node are stored in the same order as they are enumerated by `network.edges`, which keeps the
+    # tie-breaking of the optimizers the same as if they iterated over the graph itself.
+
+    def __init__(self, network: nx.DiGraph):
+        self.nodes = list(network.nodes)
+        self.node_ids = {node: i for i, node in enumerate(self.nodes)}
+
+        n = len(self.nodes)
+        self.number_of_edges = network.number_of_edges()
+
+        # in_neighbours[v][k] -> u, in_costs[v][k] == cost(u, v), in_latencies[v][k] == latency(u, v)
+        self.in_neighbours: list[list[int]] = [[] for _ in range(n)]
+        self.in_costs: list[list[float]] = [[] for _ in range(n)]
+        self.in_latencies: list[list[float]] = [[] for _ in range(n)]
+
+        # costs[u][v] == cost(u, v), latencies[u][v] == latency(u, v)
+        self.costs: list[dict[int, float]] = [{} for _ in range(n)]
+        self.latencies: list[dict[int, float]] = [{} for _ in range(n)]
+
+        # The edges in the order of `network.edges`, and their endpoints, costs and latencies as arrays
+        self.edges: list[tuple[str, str]] = []
+        edge_sources, edge_targets, edge_costs, edge_latencies = [], [], [], []
+
+        for node1, node2, data in network.edges(data=True):
+            u, v = self.node_ids[node1], self.node_ids[node2]
+
+            self.edges.append((node1, node2))
+            edge_sources.append(u)
+            edge_targets.append(v)
+            edge_costs.append(data["cost"])
+            edge_latencies.append(data["latency"])
+
+            self.in_neighbours[v].append(u)
+            self.in_costs[v].append(data["cost"])
+            self.in_latencies[v].append(data["latency"])
+
+            self.costs[u][v] = data["cost"]
+            self.latencies[u][v] = data["latency"]
+
+        self.edge_sources = np.array(edge_sources, dtype=np.int64)
+        self.edge_targets = np.array(edge_targets, dtype=np.int64)
+        self.edge_costs = np.array(edge_costs, dtype=np.float64)
+        self.edge_latencies = np.array(edge_latencies, dtype=np.float64)
+
+    # The all-pairs shortest paths (as distance and predecessor matrices) are only computed once they are needed,
+    # and then they are kept for as long as the index itself
+    @functools.cached_property
+    def cost_shortest_paths(self) -> tuple[np.ndarray, np.ndarray]:
+        return self.all_pairs_shortest_paths(self.edge_costs)
+
+    @functools.cached_property
+    def latency_shortest_paths(self) -> tuple[np.ndarray, np.ndarray]:
+        return self.all_pairs_shortest_paths(self.edge_latencies)
+
+    # cost_shortest_path_latencies[u, v] == the latency of the cheapest path from u to v
+    @functools.cached_property
+    def cost_shortest_path_latencies(self) -> np.ndarray:
+        return path_weights(self.cost_shortest_paths[1], self.latency_matrix)
+
+    # latency_shortest_path_costs[u, v] == the cost of the path with the lowest latency from u to v
+    @functools.cached_property
+    def latency_shortest_path_costs(self) -> np.ndarray:
+        return path_weights(self.latency_shortest_paths[1], self.cost_matrix)
+
+    # cost_matrix[u, v] == cost(u, v), or infinity if there is no such link (and the same for the latencies)
+    @functools.cached_property
+    def cost_matrix(self) -> np.ndarray:
+        return self.link_matrix(self.edge_costs)
+
+    @functools.cached_property
+    def latency_matrix(self) -> np.ndarray:
+        return self.link_matrix(self.edge_latencies)
+
+    # The predecessor matrix of the single link paths, i.e., direct_link_predecessors[u, v] == u if there is a link
+    @functools.cached_property
+    def direct_link_predecessors(self) -> np.ndarray:
+        n = len(self.nodes)
+        predecessors = np.full((n, n), -9999, dtype=np.int32)
+        predecessors[self.edge_sources, self.edge_targets] = self.edge_sources
+        return predecessors
+
+    def link_matrix(self, weights: np.ndarray) -> np.ndarray:
+        n = len(self.nodes)
+        link_matrix = np.full((n, n), np.inf)
+        link_matrix[self.edge_sources, self.edge_targets] = weights
+        link_matrix[np.arange(n), np.arange(n)] = 0.0
+        return link_matrix
+
+    def all_pairs_shortest_paths(self, weights: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        return shortest_path(self.weighted_graph(weights), method="D", return_predecessors=True)
+
+    # The shortest paths from a single source, for weights (given per link, in the order of `edges`) that change
+    # too often to be worth caching
+    def single_source_shortest_paths(self, weights: np.ndarray, source: int) -> tuple[np.ndarray, np.ndarray]:
+        return shortest_path(self.weighted_graph(weights), method="D", return_predecessors=True, indices=source)
+
+    # The shortest paths from the closest of several sources, each of which is reached with an offset, i.e., the paths
+    # from a virtual node with a link to each of the sources. The sources reached through their virtual link have a
+    # predecessor of -1 (and the nodes that cannot be reached at all have a negative one as well).
+    def multi_source_shortest_paths(self, weights: np.ndarray, sources: np.ndarray,
+                                    offsets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        n = len(self.nodes)
+        graph = sp.csr_array((np.concatenate([weights, offsets]),
+                              (np.concatenate([self.edge_sources, np.full(len(sources), n)]),
+                               np.concatenate([self.edge_targets, sources]))), shape=(n + 1, n + 1))
+        distances, predecessors = shortest_path(graph, method="D", return_predecessors=True, indices=n)
+        return distances[:n], np.where(predecessors[:n] == n, -1, predecessors[:n])
+
+    def weighted_graph(self, weights: np.ndarray) -> sp.csr_array:
+        n = len(self.nodes)
+        # Links with a weight of 0 are kept as explicit zeros (instead of being treated as missing links)
+        return sp.csr_array((weights, (self.edge_sources, self.edge_targets)), shape=(n, n))
+
+    # The nodes of the path from u to v (excluding u) according to a predecessor matrix, or None if there is no path
+    def shortest_path(self, predecessors: np.ndarray, u: int, v: int) -> list[int] | None:
+        path = []
+        while v != u:
+            if v < 0:
+                return None
+            path.append(v)
+            v = predecessors[u, v]
+        path.reverse()
+        return path
+
+    # O(1), once the all-pairs shortest latencies are computed
+    def is_reachable_in_time(self, source: str, target: str, delay_budget: float) -> bool:
+        latency_distances, _ = self.latency_shortest_paths
+        return latency_distances[self.node_ids[source], self.node_ids[target]] <= delay_budget + LATENCY_TOLERANCE
+
+    # usable_links[i, e] == whether the e-th link can be on a path from the publisher to the i-th subscriber within the
+    # delay budget, i.e., whether the fastest path through it is fast enough. The links (and the relays) that are not
+    # usable for any of the subscribers can be left out of the optimization altogether.
+    def usable_links(self, publisher: str, subscribers: list[str], delay_budget: float) -> np.ndarray:
+        latency_distances, _ = self.latency_shortest_paths
+        targets = [self.node_ids[subscriber] for subscriber in subscribers]
+
+        arrival_times = latency_distances[self.node_ids[publisher], self.edge_sources] + self.edge_latencies
+        remaining_times = latency_distances[np.ix_(self.edge_targets, targets)].T
+        return arrival_times[None, :] + remaining_times <= delay_budget + LATENCY_TOLERANCE
+
+    def is_up_to_date(self, network: nx.DiGraph) -> bool:
+        return len(self.nodes) == network.number_of_nodes() and self.number_of_edges == network.number_of_edges()
+
+
+# Sums the weights along the shortest paths given by a predecessor matrix, by pointer jumping: every iteration
+# doubles the length of the already summed suffix of the paths, so it takes O(log(length of the longest path)) steps
+def path_weights(predecessors: np.ndarray, weight_matrix: np.ndarray) -> np.ndarray:
+    n = len(predecessors)
+    rows, columns = np.arange(n)[:, None], np.arange(n)[None, :]
+
+    reachable = predecessors >= 0
+    # The sources (and the unreachable nodes) point to the source itself, through a step of 0
+    ancestors = np.where(reachable, predecessors, rows)
+    weights = np.where(reachable, weight_matrix[ancestors, columns], 0.0)
+
+    while np.any(ancestors != rows):
+        weights = weights + weights[rows, ancestors]
+        ancestors = ancestors[rows, ancestors]
+
+    reachable[np.arange(n), np.arange(n)] = True
+    return np.where(reachable, weights, np.inf)
+
+
+_network_indices: weakref.WeakKeyDictionary[nx.DiGraph, NetworkIndex] = weakref.WeakKeyDictionary()
+
+
+# The index is built once per network and then reused by every subsequent optimization on it
+def get_network_index(network: nx.DiGraph) -> NetworkIndex:
+    index = _network_indices.get(network, None)
+    if index is None or not index.is_up_to_date(network):
+        index = NetworkIndex(network)
+        _network_indices[network] = index
+    return index
@@ -0,0 +1,139 @@
+import time
+from typing import Callable
+
+import networkx as nx
+import numpy as np
+
+from model import Track
+from network_index import get_network_index
+from solver import MulticastTree, SingleTrackSolution, is_feasible
+
+
+# Shrinks the network to the part of it that can matter for the optimal topology of a track:
+# 1. Links that are too slow to be on any path from the publisher to one of the subscribers within the delay budget
+#    (and the links going into the publisher) are dropped, along with the relays that are left without any links.
+# 2. Links that are beaten (or matched) in both cost and latency by a two-hop detour through another relay are
+#    dropped, since any path using such a link can take the detour instead without getting more expensive or slower.
+# The reduced network is a subgraph of the original one, so every topology on it is valid on the original as well.
+def reduce_network(network: nx.DiGraph, track: Track) -> nx.DiGraph:
+    index = get_network_index(network)
+    publisher = index.node_ids[track.publisher]
+
+    usable_links = index.usable_links(track.publisher, list(track.subscribers), track.delay_budget).any(axis=0)
+    usable_links &= index.edge_targets != publisher
+
+    # The costs and the latencies of the usable links, with infinity standing for the missing (or dropped) ones
+    n = len(index.nodes)
+    costs = np.full((n, n), np.inf)
+    latencies = np.full((n, n), np.inf)
+    sources, targets = index.edge_sources[usable_links], index.edge_targets[usable_links]
+    costs[sources, targets] = index.edge_costs[usable_links]
+    latencies[sources, targets] = index.edge_latencies[usable_links]
+
+    # The links are checked (and dropped) one after the other, always against the links that are still kept, so that
+    # the detour of a dropped link can itself be replaced by (the detours of) the remaining links, even in case of ties
+    relays = np.arange(n)
+    for u, v in zip(sources, targets):
+        detours = (costs[u, :] + costs[:, v] <= costs[u, v]) & (latencies[u, :] + latencies[:, v] <= latencies[u, v])
+        detours &= (relays != u) & (relays != v)
+        if detours.any():
+            costs[u, v] = latencies[u, v] = np.inf
+
+    # The nodes and the links are kept in their original order, so that the optimizers break ties the same way
+    kept_links = [(node1, node2) for (node1, node2), u, v in zip(index.edges, index.edge_sources, index.edge_targets)
+                  if np.isfinite(costs[u, v])]
+    kept_nodes = {track.publisher, *track.subscribers, *(node for link in kept_links for node in link)}
+
+    reduced_network = nx.DiGraph()
+    reduced_network.add_nodes_from((node, network.nodes[node]) for node in index.nodes if node in kept_nodes)
+    reduced_network.add_edges_from((node1, node2, network.edges[node1, node2]) for node1, node2 in kept_links)
+    return reduced_network
+
+
+# Maps a solution found on the reduced network back to the original one. The used links are already links of the
+# original network, but (coming from an ILP) they might not form a tree, so their shortest path tree is taken instead,
+# without the branches that don't lead to any subscriber.
+def expand_solution(network: nx.DiGraph, track: Track, solution: SingleTrackSolution) -> SingleTrackSolution:
+    if not solution.success:
+        return solution
+
+    multicast_tree = MulticastTree.from_solution(network, track, solution)
+    for node in multicast_tree.subtree_in_tree(track.publisher):
+        if multicast_tree.contains(node):
+            multicast_tree.prune(node)
+
+    expanded_solution = multicast_tree.to_solution()
+    expanded_solution.lower_bound = solution.lower_bound
+    expanded_solution.timings = solution.timings
+    return expanded_solution
+
+
+# Wraps a single track optimizer so that it runs on the reduced network of every track it is given
+def reduced_network_adapter_factory(strategy: Callable[[nx.DiGraph, Track], SingleTrackSolution]) -> Callable[[nx.DiGraph, Track], SingleTrackSolution]:
+
+    def reduced_network_adapter(network: nx.DiGraph, track: Track) -> SingleTrackSolution:
+        if not is_feasible(network, track):
+            return SingleTrackSolution.not_found()
+
+        start = time.time()
+        reduced_network = reduce_network(network, track)
+        reduced = time.time()
+
+        solution = expand_solution(network, track, strategy(reduced_network, track))
+        solution.timings = {**solution.timings, "reduce": reduced - start}
+        return solution
+
+    return reduced_network_adapter
+
+
+# Keeps only the k cheapest and the k closest (in terms of latency) outgoing links of every node, plus all the links of
+# the publisher, which turns the complete graphs of the overlay topologies (with O(n^2) links) into ones with O(k * n)
+def sparsify_network(network: nx.DiGraph, track: Track, k: int) -> nx.DiGraph:
+    index = get_network_index(network)
+
+    kept_links = index.edge_sources == index.node_ids[track.publisher]
+    for weights in (index.edge_costs, index.edge_latencies):
+        # The links sorted by their source, then by their weight (ties are broken by the order of the links)
+        order = np.lexsort((weights, index.edge_sources))
+        group_starts = np.searchsorted(index.edge_sources[order], index.edge_sources[order], side="left")
+        ranks = np.empty(index.number_of_edges, dtype=np.int64)
+        ranks[order] = np.arange(index.number_of_edges) - group_starts
+        kept_links |= ranks < k
+
+    sparse_network = nx.DiGraph()
+    sparse_network.add_nodes_from(network.nodes(data=True))
+    sparse_network.add_edges_from((node1, node2, network.edges[node1, node2])
+                                  for (node1, node2), kept in zip(index.edges, kept_links) if kept)
+    return sparse_network
+
+
+# Wraps a single track optimizer so that it runs on the sparsified network of every track it is given. If the track
+# can't be served (or the optimizer fails) on the sparsified network, k is doubled until the whole network is used.
+def sparsified_network_adapter_factory(strategy: Callable[[nx.DiGraph, Track], SingleTrackSolution],
+                                       k: int) -> Callable[[nx.DiGraph, Track], SingleTrackSolution]:
+    if k < 1:
+        raise ValueError("At least one outgoing link has to be kept per node.")
+
+    def sparsified_network_adapter(network: nx.DiGraph, track: Track) -> SingleTrackSolution:
+        if not is_feasible(network, track):
+            return SingleTrackSolution.not_found()
+
+        max_out_degree = max((degree for _, degree in network.out_degree()), default=0)
+        nearest_links = k
+        while nearest_links < max_out_degree:
+            start = time.time()
+            sparse_network = sparsify_network(network, track, nearest_links)
+            sparsified = time.time()
+
+            if is_feasible(sparse_network, track):
+                solution = strategy(sparse_network, track)
+                if solution.success:
+                    # Unlike the cost, the lower bound of the sparsified network doesn't hold for the original one
+                    solution.lower_bound = None
+                    solution.timings = {**solution.timings, "sparsify": sparsified - start}
+                    return solution
+            nearest_links *= 2
+
+        return strategy(network, track)
+
+    return sparsified_network_adapter
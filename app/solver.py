@@ -1,35 +1,208 @@
-from collections import namedtuple
+from collections import defaultdict, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from enum import Enum
+import functools
 import math
+import multiprocessing
+import multiprocessing.connection
+import os
+import re
+import signal
+import subprocess
+import tempfile
+import time
 from typing import Callable
 
 import networkx as nx
+import numpy as np
 import pulp as lp
 
+from milp import build_single_track_milp, milp_from_problem, solve_milp
 from model import Track
+from network_index import LATENCY_TOLERANCE, NetworkIndex, get_network_index
 
 
 class SingleTrackSolution:
-    def __init__(self, success: bool, cost: float, max_delay: float, used_links: list[tuple[str, str]]):
+    def __init__(self, success: bool, cost: float, max_delay: float, used_links: list[tuple[str, str]],
+                 lower_bound: float | None = None):
         self.success = success
         self.cost = cost
         self.max_delay = max_delay
         self.used_links = used_links
+        # A proven lower bound on the cost of the optimal solution (if the optimizer is able to provide one)
+        self.lower_bound = lower_bound
+        # Time spent (in seconds) on the phases of the optimization, e.g., "build" and "solve" for the ILPs
+        self.timings: dict[str, float] = {}
+
+    # Relative optimality gap of the solution (0.0 for proven optimal solutions, None if unknown)
+    @property
+    def gap(self) -> float | None:
+        return relative_gap(self.cost, self.lower_bound) if self.success else None
+
+    # The node every node of the topology gets the content from (i.e., its parent in the tree), built on first access.
+    # If a node has more than one in-going link, the first one of them is kept.
+    @functools.cached_property
+    def forwarding_table(self) -> dict[str, str]:
+        return {node2: node1 for node1, node2 in reversed(self.used_links)}
 
     def __iter__(self):
         yield from (self.success, self.cost, self.max_delay, self.used_links)
 
     @staticmethod
-    def found(cost: float, max_delay: float, used_links: list[tuple[str, str]]) -> 'SingleTrackSolution':
-        return SingleTrackSolution(True, cost, max_delay, used_links)
+    def found(cost: float, max_delay: float, used_links: list[tuple[str, str]],
+              lower_bound: float | None = None) -> 'SingleTrackSolution':
+        return SingleTrackSolution(True, cost, max_delay, used_links, lower_bound)
 
     @staticmethod
     def not_found() -> 'SingleTrackSolution':
         return SingleTrackSolution(False, 0.0, 0.0, [])
 
 
+def relative_gap(cost: float, lower_bound: float | None) -> float | None:
+    if lower_bound is None:
+        return None
+    return max(0.0, cost - lower_bound) / max(abs(cost), 1e-9)
+
+
+# The time limit is meant for the whole optimization, so the time spent on building the model is deducted from it
+def remaining_time(start: float, time_limit: float | None) -> float | None:
+    if time_limit is None:
+        return None
+    return max(time_limit - (time.time() - start), 0.01)
+
+
+class SolverBackendType(str, Enum):
+    # CBC, run as a subprocess (communicating through temporary files) by PuLP
+    CBC = "cbc"
+    # HiGHS, run in-process through scipy.optimize.milp
+    HIGHS = "highs"
+
+
+# O(1) per subscriber: if a subscriber can't be reached within the delay budget (not even through the fastest path),
+# none of the optimizers can find a solution, so there is no point in starting any of them
+def is_feasible(network: nx.DiGraph, track: Track) -> bool:
+    index = get_network_index(network)
+    return all(index.is_reachable_in_time(track.publisher, subscriber, track.delay_budget)
+               for subscriber in track.subscribers)
+
+
+CBC_LOWER_BOUND_PATTERN = re.compile(r"^Lower bound:\s*(\S+)", re.MULTILINE)
+# CBC only checks its time limit between its phases, so it may overrun it by far (e.g., while still processing the root
+# node). It's interrupted if it's still running this long after the time limit, which makes it stop right away with its
+# best solution so far, and it's killed (without any solution) if it doesn't stop even after that.
+CBC_INTERRUPT_DELAY = 0.5
+CBC_KILL_DELAY = 1.0
+
+
+# Solves the problem with the given backend, optionally stopping at a deadline (in seconds) or when the relative
+# optimality gap is small enough, in which case the best feasible (but not necessarily optimal) solution is kept.
+# Returns whether a feasible solution was found, along with the lower bound on the objective proven by the solver.
+# The initial values of the variables are only used by CBC, HiGHS (through scipy) cannot be given an incumbent.
+def solve_problem(prob: lp.LpProblem, time_limit: float | None = None, gap: float | None = None,
+                  warm_start: bool = False, backend: SolverBackendType | None = None) -> tuple[bool, float | None]:
+    if backend == SolverBackendType.HIGHS:
+        return solve_problem_with_highs(prob, time_limit, gap)
+    return solve_problem_with_cbc(prob, time_limit, gap, warm_start)
+
+
+# CBC is run the same way as by PuLP, except that the time limit is enforced on the wall clock as well
+def solve_problem_with_cbc(prob: lp.LpProblem, time_limit: float | None = None, gap: float | None = None,
+                           warm_start: bool = False) -> tuple[bool, float | None]:
+    start = time.time()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        mps_path, mst_path, solution_path, log_path = (os.path.join(tmp_dir, name)
+                                                       for name in ("problem.mps", "problem.mst", "problem.sol", "cbc.log"))
+        variables, variable_names, constraint_names, _ = prob.writeMPS(mps_path, rename=1)
+
+        # Writing the problem counts towards the time limit as well
+        time_limit = remaining_time(start, time_limit)
+        solver = lp.PULP_CBC_CMD(msg=False, warmStart=warm_start, timeLimit=time_limit, gapRel=gap)
+        args = [solver.path, mps_path]
+        if warm_start:
+            solver.writesol(mst_path, prob, variables, variable_names, constraint_names)
+            args += ["-mips", mst_path]
+        if time_limit is not None:
+            args += ["-sec", str(time_limit)]
+        for option in solver.getOptions():
+            args += f"-{option}".split()
+        args += ["-solve", "-printingOptions", "all", "-solution", solution_path]
+
+        with open(log_path, "w") as log_file:
+            cbc = subprocess.Popen(args, stdout=log_file, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL)
+            try:
+                cbc.wait(None if time_limit is None else time_limit + CBC_INTERRUPT_DELAY)
+            except subprocess.TimeoutExpired:
+                cbc.send_signal(signal.SIGINT)
+                try:
+                    cbc.wait(CBC_KILL_DELAY)
+                except subprocess.TimeoutExpired:
+                    cbc.kill()
+                    cbc.wait()
+            except BaseException:
+                cbc.kill()
+                cbc.wait()
+                raise
+
+        # If CBC had to be killed, the incumbent it was started from (whose values the variables still hold) is the best
+        # solution known
+        if not os.path.exists(solution_path):
+            if warm_start:
+                prob.assignStatus(lp.LpStatusNotSolved, lp.LpSolutionIntegerFeasible)
+                return True, None
+            prob.assignStatus(lp.LpStatusNotSolved, lp.LpSolutionNoSolutionFound)
+            return False, None
+
+        status, values, _, _, _, sol_status = solver.readsol_MPS(solution_path, prob, variables, variable_names,
+                                                                 constraint_names)
+        prob.assignVarsVals(values)
+        prob.assignStatus(status, sol_status)
+        if prob.sol_status not in (lp.LpSolutionOptimal, lp.LpSolutionIntegerFeasible):
+            return False, None
+
+        # CBC only reports the lower bound in its log, if the search was stopped before proving optimality
+        with open(log_path, "r") as log_file:
+            match = CBC_LOWER_BOUND_PATTERN.search(log_file.read())
+
+    objective = prob.objective.value()
+    if match is not None:
+        return True, min(float(match.group(1)), objective)
+    elif prob.sol_status == lp.LpSolutionOptimal and gap is not None:
+        # "Optimal" only means that the solution is within the allowed gap
+        return True, objective * (1 - gap)
+    elif prob.sol_status == lp.LpSolutionOptimal:
+        return True, objective
+    return True, None
+
+
+# The problem is converted into matrices and solved without leaving the process, then the values of the solution
+# are written back into the variables of the problem, just like PuLP does after running a solver
+def solve_problem_with_highs(prob: lp.LpProblem, time_limit: float | None = None,
+                             gap: float | None = None) -> tuple[bool, float | None]:
+    model, variables = milp_from_problem(prob)
+    result = solve_milp(model, time_limit, gap)
+
+    if result.x is None:
+        prob.assignStatus(lp.LpStatusInfeasible if result.status == 2 else lp.LpStatusNotSolved)
+        return False, None
+
+    prob.assignVarsVals({var.name: float(value) for var, value in zip(variables, result.x)})
+    if result.status == 0:
+        prob.assignStatus(lp.LpStatusOptimal, lp.LpSolutionOptimal)
+    else:
+        prob.assignStatus(lp.LpStatusNotSolved, lp.LpSolutionIntegerFeasible)
+
+    lower_bound = getattr(result, "mip_dual_bound", None)
+    if lower_bound is None or not math.isfinite(lower_bound):
+        return True, None
+    return True, min(lower_bound + prob.objective.constant, prob.objective.value())
+
+
 # Spectrum::LeftMost - Keeping the delay constraints
 def direct_link_tree(network: nx.Graph, track: Track) -> SingleTrackSolution:
+    if not is_feasible(network, track):
+        return SingleTrackSolution.not_found()
+
     cost = 0.0
     max_delay = 0.0
     edges = []
@@ -49,133 +222,614 @@ def direct_link_tree(network: nx.Graph, track: Track) -> SingleTrackSolution:
     return SingleTrackSolution.found(cost, max_delay, edges)
 
 
-# Spectrum::Left - Approximately optimal in cost while keeping the delay constraints
-def multicast_heuristic(network: nx.DiGraph, track: Track) -> SingleTrackSolution:
-    # Suppose that n is the number of subscribers and m is the number of links in the tree
+class MulticastTree:
+    # The working tree of the multicast heuristic. It is kept as a standalone object (rather than
+    # being local to `multicast_heuristic`), so that an already optimized topology can be loaded
+    # back and extended subscriber by subscriber without rebuilding the whole tree.
+    #
+    # The tree is stored as a parent array over the node ids of the network index, along with its
+    # Euler tour (i.e., the preorder of the nodes, in which every subtree is a contiguous interval).
+    # The tour is only rebuilt (in O(n)) after the structure of the tree has changed, and in exchange
+    # subtree membership and the maximum latency within a subtree are O(1) lookups.
+
+    def __init__(self, network: nx.DiGraph, track: Track):
+        self.network = network
+        self.index = get_network_index(network)
+        self.track = track
+        self.cost = 0.0
+
+        n = len(self.index.nodes)
+        self.root = self.index.node_ids[track.publisher]
+        self.parents = [-1] * n
+        self.children: list[list[int]] = [[] for _ in range(n)]
+        self.in_tree = [False] * n
+        self.latencies = [math.inf] * n
+
+        self.in_tree[self.root] = True
+        self.latencies[self.root] = 0.0
+
+        # order[entries[v]:exits[v]] is the subtree of v
+        self.order = []
+        self.entries = [0] * n
+        self.exits = [0] * n
+        self.subtree_max_latencies = [0.0] * n
+        self.is_indexed = False
 
-    latencies = {track.publisher: 0.0}
-    cost = 0.0
-    tree = nx.DiGraph()
-    tree.add_node(track.publisher)
-
-    # O(1) ideally (if a reverse edge list is stored in the graph representation), otherwise implementation-defined
-    def previous_in_tree(node: str) -> str:
-        return list(tree.in_edges(node))[0][0]
-
-    # O(n) + O(n + m) ≈ O(n)
-    # └┬─┘   └──┬───┘
-    #  │        └─ BFS's base complexity (assuming edge lists are used),
-    #  │           but since it's executed on a tree, m will be at most n - 1,
-    #  │           thus it reduces to O(n + n) ≈ O(n)
-    #  └─ list comprehension's complexity
-    def subtree_in_tree(node: str) -> list[str]:
-        return nx.bfs_tree(tree, node).nodes
+    @staticmethod
+    def from_solution(network: nx.DiGraph, track: Track, solution: SingleTrackSolution) -> 'MulticastTree':
+        multicast_tree = MulticastTree(network, track)
+
+        # The used links of a solution (e.g., one coming from the ILP) are not necessarily a tree, since a node
+        # might be reached through multiple paths. Taking the shortest path tree (in terms of latency) of them
+        # never increases the cost, nor the delay of any of the nodes.
+        used_links = nx.DiGraph()
+        used_links.add_node(track.publisher)
+        for edge in solution.used_links:
+            used_links.add_edge(*edge, **network.get_edge_data(*edge))
+        predecessors, _ = nx.dijkstra_predecessor_and_distance(used_links, track.publisher, weight="latency")
+
+        shortest_path_tree = nx.DiGraph()
+        shortest_path_tree.add_edges_from((parents[0], node) for node, parents in predecessors.items() if parents)
+        for u, v in nx.bfs_edges(shortest_path_tree, track.publisher):
+            multicast_tree.attach(u, v)
+
+        return multicast_tree
+
+    def to_solution(self) -> SingleTrackSolution:
+        self.reindex()
+        nodes, parents = self.index.nodes, self.parents
+
+        # O(n)
+        max_delay = max(self.latencies[v] for v in self.order)
+        used_links = [(nodes[parents[v]], nodes[v]) for v in self.order if v != self.root]
+
+        return SingleTrackSolution.found(self.cost, max_delay, used_links)
+
+    # O(n), but only if the structure of the tree has changed since the last call
+    def reindex(self):
+        if self.is_indexed:
+            return
+
+        order, entries, exits = [], self.entries, self.exits
+        children, parents, latencies = self.children, self.parents, self.latencies
+        subtree_sizes, subtree_max_latencies = {}, self.subtree_max_latencies
+
+        stack = [self.root]
+        while stack:
+            v = stack.pop()
+            entries[v] = len(order)
+            order.append(v)
+            subtree_sizes[v] = 1
+            subtree_max_latencies[v] = latencies[v]
+            stack.extend(reversed(children[v]))
+
+        # Children come after their parents in the preorder, so every subtree is complete by the time it's aggregated
+        for v in reversed(order):
+            exits[v] = entries[v] + subtree_sizes[v]
+            if v != self.root:
+                parent = parents[v]
+                subtree_sizes[parent] += subtree_sizes[v]
+                subtree_max_latencies[parent] = max(subtree_max_latencies[parent], subtree_max_latencies[v])
+
+        self.order = order
+        self.is_indexed = True
+
+    # O(1), given that the tree is indexed
+    def is_in_subtree(self, v: int, root: int) -> bool:
+        return self.entries[root] <= self.entries[v] < self.exits[root]
+
+    def contains(self, node: str) -> bool:
+        return self.in_tree[self.index.node_ids[node]]
+
+    def attach(self, connection_node: str, node: str):
+        u, v = self.index.node_ids[connection_node], self.index.node_ids[node]
+
+        self.parents[v] = u
+        self.children[u].append(v)
+        self.in_tree[v] = True
+
+        self.cost += self.index.costs[u][v]
+        self.latencies[v] = self.latencies[u] + self.index.latencies[u][v]
+
+        self.is_indexed = False
+
+    def detach(self, node: str):
+        v = self.index.node_ids[node]
+        u = self.parents[v]
+
+        self.parents[v] = -1
+        self.children[u].remove(v)
+        self.in_tree[v] = False
+
+        self.cost -= self.index.costs[u][v]
+        self.latencies[v] = math.inf
+
+        self.is_indexed = False
+
+    # Moves the subtree of v under a new parent, and shifts the latencies within it accordingly.
+    # O(n), since the subtree has to be walked through (and the tree has to be reindexed later on)
+    def redirect(self, v: int, new_parent: int, delay_balance: float, subtree: list[int]):
+        self.children[self.parents[v]].remove(v)
+        self.children[new_parent].append(v)
+        self.parents[v] = new_parent
+
+        for w in subtree:
+            self.latencies[w] += delay_balance
+
+        self.is_indexed = False
+
+    def is_relay_only(self, node: str) -> bool:
+        return node != self.track.publisher and node not in self.track.subscribers
+
+    # O(1)
+    def previous_in_tree(self, node: str) -> str:
+        return self.index.nodes[self.parents[self.index.node_ids[node]]]
+
+    # O(k), where k is the size of the subtree, given that the tree is indexed
+    def subtree_in_tree(self, node: str) -> list[str]:
+        self.reindex()
+        v = self.index.node_ids[node]
+        return [self.index.nodes[w] for w in self.order[self.entries[v]:self.exits[v]]]
 
     # O(n) * O(1) ≈ O(n)
-    def reverse_path_to_root(node: str) -> list[str]:
+    def reverse_path_to_root(self, node: str) -> list[str]:
         path = []
         while True:
             path.append(node)
-            if node == track.publisher:
+            if node == self.track.publisher:
                 break
-            node = previous_in_tree(node)
+            node = self.previous_in_tree(node)
         path.reverse()
         return path
 
-    # O(n) + O(n) * (O(n) + O(n)) + O(n) ≈ O(n) + O(n²) + O(n) ≈ O(n²)
-    def augment(node: str):
-        nonlocal network, latencies, cost, tree
+    # O(n) + O(n) * O(1) + O(n) ≈ O(n)
+    def augment(self, node: str):
+        track, latencies, parents, index = self.track, self.latencies, self.parents, self.index
+        x = index.node_ids[node]
+        node_costs, node_latencies = index.costs[x], index.latencies[x]
 
         Replacement = namedtuple("Replacement", [
-            "new_edge", "old_edge", "subtree", "delay_balance", "cost_balance"])
-        best_replacement = Replacement(None, None, [], 0.0, math.inf)
-
-        # This assertion should hold true, since `tree` MUST be a tree graph in any given point in time,
-        # thus a shortest path between two node is the one and only path between them.
-        #   assert list(nx.shortest_path(tree, track.publisher, node)) == reverse_path_to_root(node)
-        loop_causing_nodes = set(reverse_path_to_root(node))
-
-        for tree_node in set(tree.nodes) - loop_causing_nodes:
-            # This assertion should hold true, since `tree` MUST be a tree graph in any given point in time,
-            # thus a shortest path between two node is the one and only path between them, and also in a
-            # directed tree, there must be at most one parent for each node (more specifically: 0 for root,
-            # and 1 for every other node):
-            #   assert nx.shortest_path(tree, track.publisher, tree_node)[-2] == previous_in_tree(tree_node)
-            previous_node = previous_in_tree(tree_node)
-
-            to_be_replaced_edge = (previous_node, tree_node)
-            replacement_edge = (node, tree_node)
-
-            new_base_e2e_delay = latencies[node] + network.get_edge_data(*replacement_edge)["latency"]
-            old_base_e2e_delay = latencies[previous_node] + network.get_edge_data(*to_be_replaced_edge)["latency"]
-            delay_balance = new_base_e2e_delay - old_base_e2e_delay
+            "new_parent", "node", "delay_balance", "cost_balance"])
+        best_replacement = Replacement(None, None, 0.0, math.inf)
+
+        self.reindex()
 
-            cost_balance = network.get_edge_data(*replacement_edge)["cost"] - network.get_edge_data(*to_be_replaced_edge)["cost"]
+        for v in self.order:
+            # The nodes on the path from the root to the node (including itself) would cause a loop,
+            # and those are exactly the nodes whose subtree contains the node
+            if self.is_in_subtree(x, v):
+                continue
 
-            subtree = subtree_in_tree(tree_node)
+            # The replacement edge might not even exist (in case the network is not a full mesh)
+            if v not in node_costs:
+                continue
 
-            # If the delay budget is met by redirecting the traffic, and the replacement comes with cost reductions
-            if all(latencies[v] + delay_balance < track.delay_budget for v in subtree) and cost_balance < best_replacement.cost_balance:
-                best_replacement = Replacement(replacement_edge, to_be_replaced_edge, subtree, delay_balance, cost_balance)
+            previous_v = parents[v]
+
+            new_base_e2e_delay = latencies[x] + node_latencies[v]
+            old_base_e2e_delay = latencies[previous_v] + index.latencies[previous_v][v]
+            delay_balance = new_base_e2e_delay - old_base_e2e_delay
+
+            cost_balance = node_costs[v] - index.costs[previous_v][v]
+
+            # If the delay budget is met by redirecting the traffic (which is the case if it's met by
+            # the farthest node of the subtree), and the replacement comes with cost reductions
+            if self.subtree_max_latencies[v] + delay_balance < track.delay_budget and cost_balance < best_replacement.cost_balance:
+                best_replacement = Replacement(x, v, delay_balance, cost_balance)
 
         if best_replacement.cost_balance < 0 or (best_replacement.cost_balance == 0 and best_replacement.delay_balance < 0):
-            tree.remove_edge(*best_replacement.old_edge)
-            tree.add_edge(*best_replacement.new_edge)
-            cost += best_replacement.cost_balance
-            for v in best_replacement.subtree:
-                latencies[v] += best_replacement.delay_balance
-
-    # O(n) + O(n²) ≈ O(n²)
-    def add_subscriber(node: str) -> str | None:
-        nonlocal network, track, latencies, cost, tree
-
-        # Find the best edge to connect the node to the tree (without reordering the whole tree)
-        best_edge = min(
-            filter(
-                lambda edge, node=node:
-                    edge[0] in tree.nodes and
-                    edge[1] == node and
-                    latencies[edge[0]] + network.get_edge_data(*edge)["latency"] <= track.delay_budget,
-                network.edges
-            ),
-            key=lambda edge: (
-                network.get_edge_data(*edge)["cost"],
-                latencies[edge[0]] + network.get_edge_data(*edge)["latency"]
-            ),
-            default=None
-        )
+            v = best_replacement.node
+            subtree = self.order[self.entries[v]:self.exits[v]]
+            self.redirect(v, best_replacement.new_parent, best_replacement.delay_balance, subtree)
+            self.cost += best_replacement.cost_balance
+
+    # O(deg(n)) + O(n) ≈ O(n)
+    def add_subscriber(self, node: str) -> str | None:
+        track, latencies, in_tree, index = self.track, self.latencies, self.in_tree, self.index
+
+        # Find the best edge to connect the node to the tree (without reordering the whole tree),
+        # only looking at the in-neighbours of the node that are already in the tree
+        v = index.node_ids[node]
+        best_connection, best_key = None, None
+        for u, cost, latency in zip(index.in_neighbours[v], index.in_costs[v], index.in_latencies[v]):
+            if not in_tree[u]:
+                continue
+
+            delay = latencies[u] + latency
+            if delay <= track.delay_budget and (best_key is None or (cost, delay) < best_key):
+                best_connection, best_key = u, (cost, delay)
 
         # Didn't find any suitable edge (i.e., not even the direct link to the publisher would work)
-        if best_edge is None:
+        if best_connection is None:
             return None
 
-        # Add the edge to the tree
-        connection_node = best_edge[0]
-        tree.add_edge(*best_edge)
-
-        # Update the cost and latency values
-        best_data = network.get_edge_data(*best_edge)
-        cost += best_data["cost"]
-        latencies[node] = latencies[connection_node] + best_data["latency"]
+        # Add the edge to the tree (and update the cost and latency values)
+        connection_node = index.nodes[best_connection]
+        self.attach(connection_node, node)
 
         # See if we can improve one of our existing connections by redirecting traffic through the newly added node
-        augment(node)
+        self.augment(node)
 
         return connection_node
 
-    # O(n) * O(n²) ≈ O(n³)
+    # Removes the node if it became a leaf that doesn't lead to any subscriber, together with every
+    # relay-only branch that was left dangling by it. Returns the closest remaining node on its path to the root.
+    # O(n) * O(1) ≈ O(n)
+    def prune(self, node: str) -> str:
+        while self.is_relay_only(node) and not self.children[self.index.node_ids[node]]:
+            previous_node = self.previous_in_tree(node)
+            self.detach(node)
+            node = previous_node
+        return node
+
+    # Tries to get rid of a relay-only node by redirecting each of its children to another node of the tree
+    # (outside of the relay's subtree), if that can be done within the delay budget at a lower cost.
+    # O(deg(n)) * O(1) ≈ O(n)
+    def bypass(self, relay: str) -> bool:
+        track, latencies, index = self.track, self.latencies, self.index
+
+        self.reindex()
+
+        r = index.node_ids[relay]
+        previous_r = self.parents[r]
+
+        cost_balance = -index.costs[previous_r][r]
+        replacements = []
+        for child in self.children[r]:
+            subtree_delay = self.subtree_max_latencies[child] - latencies[child]
+
+            best_connection, best_key = None, None
+            for u, cost, latency in zip(index.in_neighbours[child], index.in_costs[child], index.in_latencies[child]):
+                if not self.in_tree[u] or self.is_in_subtree(u, r):
+                    continue
+
+                delay = latencies[u] + latency
+                if delay + subtree_delay <= track.delay_budget and (best_key is None or (cost, delay) < best_key):
+                    best_connection, best_key = u, (cost, delay)
+
+            if best_connection is None:
+                return False
+
+            cost_balance += best_key[0] - index.costs[r][child]
+            delay_balance = best_key[1] - latencies[child]
+            replacements.append((child, best_connection, delay_balance, self.order[self.entries[child]:self.exits[child]]))
+
+        if cost_balance >= 0:
+            return False
+
+        for child, connection, delay_balance, subtree in replacements:
+            self.redirect(child, connection, delay_balance, subtree)
+        self.cost += cost_balance + index.costs[previous_r][r]
+        self.detach(relay)
+
+        return True
+
+
+# Spectrum::Left - Approximately optimal in cost while keeping the delay constraints
+def multicast_heuristic(network: nx.DiGraph, track: Track) -> SingleTrackSolution:
+    if not is_feasible(network, track):
+        return SingleTrackSolution.not_found()
+
+    # Suppose that n is the number of subscribers and m is the number of links in the tree
+    multicast_tree = MulticastTree(network, track)
+
+    # O(n) * O(n) ≈ O(n²)
     for node in track.subscribers:
-        if add_subscriber(node) is None:
+        if multicast_tree.add_subscriber(node) is None:
+            return SingleTrackSolution.not_found()
+
+    return multicast_tree.to_solution()
+
+
+# Grafts a newly joined subscriber onto an already optimized topology of the track (the same way the multicast
+# heuristic would do it: attaching it with the cheapest feasible link, then locally augmenting the tree around it),
+# instead of optimizing the whole track again. Fails if the delay budget cannot be met this way.
+def extend_tree(network: nx.DiGraph, track: Track, solution: SingleTrackSolution, subscriber: str) -> SingleTrackSolution:
+    multicast_tree = MulticastTree.from_solution(network, track, solution)
+
+    # The subscriber might already be part of the tree as a relay, in which case it's already getting the content
+    if not multicast_tree.contains(subscriber) and multicast_tree.add_subscriber(subscriber) is None:
+        return SingleTrackSolution.not_found()
+
+    return multicast_tree.to_solution()
+
+
+# Removes a departed subscriber (which must have already been removed from the track) from an already optimized
+# topology of the track, together with the relay-only branches that don't lead to any subscriber anymore.
+# Optionally, the relay-only nodes on the path from the affected subtree up to the root (at most
+# `improvement_depth` of them) are tried to be bypassed, if that makes the topology cheaper.
+def prune_tree(network: nx.DiGraph, track: Track, solution: SingleTrackSolution, subscriber: str,
+               improve: bool = False, improvement_depth: int = 3) -> SingleTrackSolution:
+    multicast_tree = MulticastTree.from_solution(network, track, solution)
+
+    if not multicast_tree.contains(subscriber):
+        return multicast_tree.to_solution()
+
+    node = multicast_tree.prune(subscriber)
+
+    if improve:
+        affected_path = multicast_tree.reverse_path_to_root(node)[1:]
+        for relay in reversed(affected_path[-improvement_depth:]):
+            # Pruning after a successful bypass might have already removed the next relays of the path as well
+            if multicast_tree.contains(relay) and multicast_tree.is_relay_only(relay):
+                previous_node = multicast_tree.previous_in_tree(relay)
+                if multicast_tree.bypass(relay):
+                    multicast_tree.prune(previous_node)
+
+    return multicast_tree.to_solution()
+
+
+# Spectrum::Left - Approximately optimal in cost while keeping the delay constraints (using the metric closure)
+# A delay-constrained variant of the shortest path heuristic for Steiner trees, which (without the delay budget) has the
+# same approximation ratio of 2 as KMB: the subscribers are connected to the tree one by one, always the one that is
+# the cheapest to reach from any node of the tree. Whenever the cheapest path from a node would break the delay budget,
+# it is repaired by falling back to the direct link or to the path with the lowest latency from the same node (which
+# always exists from the publisher, unless the track is infeasible altogether). The paths are taken from the (cached)
+# all-pairs shortest paths of the network index, so every step is only a handful of vectorized operations.
+def delay_constrained_steiner_tree(network: nx.DiGraph, track: Track) -> SingleTrackSolution:
+    if not is_feasible(network, track):
+        return SingleTrackSolution.not_found()
+
+    index = get_network_index(network)
+
+    # The kinds of paths the subscribers can be connected through: (costs, latencies, predecessors)
+    routes = [
+        (index.cost_shortest_paths[0], index.cost_shortest_path_latencies, index.cost_shortest_paths[1]),
+        (index.cost_matrix, index.latency_matrix, index.direct_link_predecessors),
+        (index.latency_shortest_path_costs, index.latency_shortest_paths[0], index.latency_shortest_paths[1]),
+    ]
+
+    multicast_tree = MulticastTree(network, track)
+
+    # Sorted, so that ties are always broken the same way
+    subscribers = np.array(sorted(index.node_ids[subscriber] for subscriber in track.subscribers), dtype=np.int64)
+    remaining = np.ones(len(subscribers), dtype=bool)
+
+    # The cheapest connection of every remaining subscriber to the tree that meets the delay budget (found so far)
+    best_costs = np.full(len(subscribers), np.inf)
+    best_sources = np.full(len(subscribers), -1, dtype=np.int64)
+    best_routes = np.full(len(subscribers), -1, dtype=np.int64)
+
+    # The nodes that either joined the tree, or got closer to the publisher in the last step, as only they can offer
+    # better connections than the ones already known
+    changed_nodes = [multicast_tree.root]
+
+    while True:
+        in_tree, tree_latencies = np.array(multicast_tree.in_tree), np.array(multicast_tree.latencies)
+        remaining &= ~in_tree[subscribers]
+        if not remaining.any():
+            break
+
+        # Pruning a branch of the tree might have removed the best connection of some of the subscribers
+        if not in_tree[best_sources[best_sources >= 0]].all():
+            best_costs[:], best_sources[:], best_routes[:] = np.inf, -1, -1
+            changed_nodes = np.flatnonzero(in_tree)
+
+        sources = np.array(changed_nodes, dtype=np.int64)
+        for route, (route_costs, route_latencies, _) in enumerate(routes):
+            arrival_times = tree_latencies[sources, None] + route_latencies[np.ix_(sources, subscribers)]
+            costs = np.where(arrival_times <= track.delay_budget, route_costs[np.ix_(sources, subscribers)], np.inf)
+            best = np.argmin(costs, axis=0)
+            costs = costs[best, np.arange(len(subscribers))]
+            improved = costs < best_costs
+            best_costs[improved] = costs[improved]
+            best_sources[improved] = sources[best[improved]]
+            best_routes[improved] = route
+
+        candidates = np.where(remaining, best_costs, np.inf)
+        i = int(np.argmin(candidates))
+        if candidates[i] == np.inf:
             return SingleTrackSolution.not_found()
 
-    # O(n)
-    max_delay = max(latencies.values())
+        source, subscriber = int(best_sources[i]), int(subscribers[i])
+        path = index.shortest_path(routes[best_routes[i]][2], source, subscriber)
+        changed_nodes = graft_path(multicast_tree, source, path)
+
+    return multicast_tree.to_solution()
+
+
+# Adds a path (starting from a node of the tree) to the tree. The nodes of the path that are already in the tree are
+# moved onto the path if that's how they can be reached sooner (their old branch is pruned, if it became useless),
+# so no node gets farther from the publisher than along the path. Returns the nodes whose latency has changed.
+def graft_path(multicast_tree: MulticastTree, source: int, path: list[int]) -> list[int]:
+    index, latencies, parents = multicast_tree.index, multicast_tree.latencies, multicast_tree.parents
+
+    changed_nodes = []
+    u = source
+    for v in path:
+        arrival_time = latencies[u] + index.latencies[u][v]
+        if not multicast_tree.in_tree[v]:
+            multicast_tree.attach(index.nodes[u], index.nodes[v])
+            changed_nodes.append(v)
+        elif arrival_time < latencies[v]:
+            previous_v = parents[v]
+            multicast_tree.reindex()
+            subtree = multicast_tree.order[multicast_tree.entries[v]:multicast_tree.exits[v]]
+            multicast_tree.redirect(v, u, arrival_time - latencies[v], subtree)
+            multicast_tree.cost += index.costs[u][v] - index.costs[previous_v][v]
+            multicast_tree.prune(index.nodes[previous_v])
+            changed_nodes.extend(subtree)
+        u = v
+
+    return changed_nodes
+
+
+# Spectrum::Left - Approximately optimal in cost while keeping the delay constraints (using Lagrangian relaxation)
+# The subscribers are connected to the tree one by one (always the one that is the cheapest to reach from any node of the
+# tree), each through the path found by LARAC for it: the delay budget of the path is relaxed into the objective with a
+# multiplier λ, i.e., every link is weighted by cij + λ * dij (and every node of the tree by λ times its latency), and λ
+# is set from the cheapest path that is too late and the cheapest one that is in time (starting from the cheapest and
+# the fastest paths), until no path is cheaper by the relaxed cost than either of them. Every step is a shortest path
+# search, and there are only a handful of them per subscriber.
+# Since the tree has to include a path within the budget to every subscriber, which costs at least
+# dist_λ(s) - λ * D (for any λ >= 0), the largest of these (with λ set by LARAC for every subscriber separately, from
+# the publisher) is a lower bound on the cost of the optimal solution.
+def lagrangian_relaxation_tree(network: nx.DiGraph, track: Track, max_iterations: int = 20) -> SingleTrackSolution:
+    if not is_feasible(network, track):
+        return SingleTrackSolution.not_found()
+
+    index = get_network_index(network)
+    root = index.node_ids[track.publisher]
+    subscribers = sorted(index.node_ids[subscriber] for subscriber in track.subscribers)
+
+    lower_bound = 0.0
+    for subscriber in subscribers:
+        path = larac_path(index, np.array([root]), np.zeros(1), subscriber, track.delay_budget, max_iterations)
+        if path is None:
+            return SingleTrackSolution.not_found()
+        lower_bound = max(lower_bound, path[2])
+
+    multicast_tree = MulticastTree(network, track)
+    remaining = set(subscribers)
+    while remaining:
+        in_tree = np.flatnonzero(multicast_tree.in_tree)
+        latencies = np.array(multicast_tree.latencies)[in_tree]
+
+        distances, _ = index.multi_source_shortest_paths(index.edge_costs, in_tree, np.zeros(len(in_tree)))
+        subscriber = min(remaining, key=lambda v: (distances[v], v))
 
-    return SingleTrackSolution.found(cost, max_delay, list(tree.edges))
+        path = larac_path(index, in_tree, latencies, subscriber, track.delay_budget, max_iterations)
+        if path is None:
+            return SingleTrackSolution.not_found()
+        graft_path(multicast_tree, path[0], path[1])
+        remaining = {v for v in remaining if not multicast_tree.in_tree[v]}
+
+    # The paths are only shared as far as they happen to go through the nodes of the tree, so the tree is improved by
+    # redirecting subtrees through other nodes of the tree, wherever that's cheaper (and still within the budget)
+    for node in multicast_tree.subtree_in_tree(track.publisher):
+        multicast_tree.augment(node)
+    for node in multicast_tree.subtree_in_tree(track.publisher):
+        if multicast_tree.contains(node):
+            multicast_tree.prune(node)
+
+    solution = multicast_tree.to_solution()
+    solution.lower_bound = min(lower_bound, solution.cost)
+    return solution
+
+
+# LARAC for the cheapest path from any of the sources (each of which is reached at the given latency) to the target
+# that arrives within the delay budget. Returns the source, the rest of the path and the Lagrangian lower bound on the
+# cost of such a path, or None if there is no such path.
+def larac_path(index: NetworkIndex, sources: np.ndarray, latencies: np.ndarray, target: int, delay_budget: float,
+               max_iterations: int) -> tuple[int, list[int], float] | None:
+
+    # The path with the lowest cij + λ * dij from the sources, along with its cost, its arrival time and the bound
+    def relaxed_path(multiplier: float) -> tuple[int, list[int], float, float, float] | None:
+        if math.isinf(multiplier):
+            _, predecessors = index.multi_source_shortest_paths(index.edge_latencies, sources, latencies)
+        else:
+            _, predecessors = index.multi_source_shortest_paths(index.edge_costs + multiplier * index.edge_latencies,
+                                                                sources, multiplier * latencies)
+        path = [target]
+        while predecessors[path[-1]] != -1:
+            if predecessors[path[-1]] < 0:
+                return None
+            path.append(int(predecessors[path[-1]]))
+        path.reverse()
+
+        source = path[0]
+        cost = sum(index.costs[u][v] for u, v in zip(path, path[1:]))
+        arrival_time = float(latencies[np.searchsorted(sources, source)]) + \
+            sum(index.latencies[u][v] for u, v in zip(path, path[1:]))
+        bound = cost if multiplier == 0 else -math.inf if math.isinf(multiplier) else \
+            cost + multiplier * (arrival_time - delay_budget)
+        return source, path[1:], cost, arrival_time, bound
+
+    cheapest = relaxed_path(0.0)
+    if cheapest is None:
+        return None
+    if cheapest[3] <= delay_budget + LATENCY_TOLERANCE:
+        return cheapest[0], cheapest[1], cheapest[4]
+
+    fastest = relaxed_path(math.inf)
+    if fastest[3] > delay_budget + LATENCY_TOLERANCE:
+        return None
+
+    # cheapest is always too late, and fastest is always in time
+    lower_bound = cheapest[4]
+    for _ in range(max_iterations):
+        multiplier = (fastest[2] - cheapest[2]) / (cheapest[3] - fastest[3])
+        path = relaxed_path(multiplier)
+        lower_bound = max(lower_bound, path[4])
+
+        relaxed_cost = cheapest[2] + multiplier * cheapest[3]
+        if path[2] + multiplier * path[3] >= relaxed_cost - LATENCY_TOLERANCE * max(1.0, abs(relaxed_cost)):
+            break
+        if path[3] <= delay_budget + LATENCY_TOLERANCE:
+            fastest = path
+        else:
+            cheapest = path
+
+    return fastest[0], fastest[1], min(lower_bound, fastest[2])
+
+
+# Returns the links on the path from the publisher to each of the subscribers of a tree shaped solution
+def paths_in_tree(track: Track, solution: SingleTrackSolution) -> dict[str, list[tuple[str, str]]]:
+    previous_in_tree = {node2: node1 for node1, node2 in solution.used_links}
+
+    paths = {}
+    for subscriber in track.subscribers:
+        path = []
+        node = subscriber
+        while node != track.publisher:
+            path.append((previous_in_tree[node], node))
+            node = previous_in_tree[node]
+        path.reverse()
+        paths[subscriber] = path
+    return paths
+
+
+# Returns the latency of every node of a tree shaped solution (measured from the publisher)
+def tree_latencies(network: nx.DiGraph, publisher: str, used_links: list[tuple[str, str]]) -> dict[str, float]:
+    tree = nx.DiGraph(used_links)
+    tree.add_node(publisher)
+
+    latencies = {publisher: 0.0}
+    for node1, node2 in nx.bfs_edges(tree, publisher):
+        latencies[node2] = latencies[node1] + network.edges[node1, node2]["latency"]
+    return latencies
+
+
+# Sets the initial values of the ILP's variables according to a feasible (tree shaped) solution,
+# so that the solver can start branch-and-bound with it as an incumbent
+def set_initial_values(network: nx.DiGraph, track: Track, solution: SingleTrackSolution,
+                       transmission_bitrates: dict, link_usages: dict, selected_links: dict):
+    used_links = set(solution.used_links)
+    for link, var in link_usages.items():
+        var.setInitialValue(1 if link in used_links else 0)
+
+    paths = paths_in_tree(track, solution)
+    for stream in track.streams.keys():
+        path = set(paths[track.subscriber_of(stream)])
+        for link in network.edges:
+            value = 1 if link in path else 0
+            transmission_bitrates[stream][link].setInitialValue(value)
+            selected_links[stream][link].setInitialValue(value)
+
+
+# Fixes the variables of a stream to 0 on the links that are too slow to be on any path from the publisher to its
+# subscriber within the delay budget, so that the solver doesn't have to branch on them
+def exclude_unusable_links(network: nx.DiGraph, publisher: str, subscriber: str, delay_budget: float,
+                           transmission_bitrates: dict, selected_links: dict):
+    index = get_network_index(network)
+    usable_links = index.usable_links(publisher, [subscriber], delay_budget)[0]
+    for link, usable in zip(index.edges, usable_links):
+        if not usable:
+            transmission_bitrates[link].upBound = 0
+            selected_links[link].upBound = 0
 
 
 # Spectrum::Right - Optimal in cost while keeping the delay constraints
-def get_optimal_topology_for_a_single_track(network: nx.DiGraph, track: Track) -> SingleTrackSolution:
+def get_optimal_topology_for_a_single_track(network: nx.DiGraph, track: Track,
+                                            warm_start: 'SingleTrackOptimizerType | None' = None,
+                                            time_limit: float | None = None,
+                                            gap: float | None = None,
+                                            backend: SolverBackendType | None = None) -> SingleTrackSolution:
+    if not is_feasible(network, track):
+        return SingleTrackSolution.not_found()
+
+    start = time.time()
+
     prob = lp.LpProblem("MoQ_relay_topology_optimization", lp.LpMinimize)
 
     # xfij == x_{stream}_{link}; xfij >= 0 constraint is always satisfied
@@ -190,6 +844,10 @@ def get_optimal_topology_for_a_single_track(network: nx.DiGraph, track: Track) -
     selected_links = lp.LpVariable.dicts(
         "z", (track.streams.keys(), network.edges), 0, 1, cat=lp.LpBinary)
 
+    for stream in track.streams.keys():
+        exclude_unusable_links(network, track.publisher, track.subscriber_of(stream), track.delay_budget,
+                               transmission_bitrates[stream], selected_links[stream])
+
     # Objective function
     prob += lp.lpSum([data["cost"] * link_usages[(node1, node2)] for node1, node2, data
                       in network.edges(data=True)]), "total_link_usage"
@@ -210,7 +868,7 @@ def get_optimal_topology_for_a_single_track(network: nx.DiGraph, track: Track) -
                                 for link in network.edges if link[1] == node])
             out_going = lp.lpSum([transmission_bitrates[stream][link]
                                   for link in network.edges if link[0] == node])
-            prob += in_going - out_going == node_reliabilities[node], \
+            prob += in_going - out_going == node_reliabilities.get(node, 0), \
                 f"nodal_balance_for_{stream}_{node}"
 
     # Constraint: zfij*M >= xfij
@@ -226,9 +884,18 @@ def get_optimal_topology_for_a_single_track(network: nx.DiGraph, track: Track) -
                           for node1, node2, data in network.edges(data=True)]) <= track.delay_budget, \
             f"delay_budget_for_{stream}"
 
-    prob.solve(lp.PULP_CBC_CMD(msg=False))
-
-    success = prob.status == lp.LpStatusOptimal
+    # Seed the solver with the solution of a (much faster) heuristic, if asked to
+    initial_solution = None
+    if warm_start is not None:
+        initial_solution = get_single_track_optimizer(warm_start)(network, track)
+        if initial_solution.success:
+            set_initial_values(network, track, initial_solution, transmission_bitrates, link_usages, selected_links)
+
+    built = time.time()
+    success, lower_bound = solve_problem(prob, remaining_time(start, time_limit), gap,
+                                         warm_start=initial_solution is not None and initial_solution.success,
+                                         backend=backend)
+    timings = {"build": built - start, "solve": time.time() - built}
     if not success:
         return SingleTrackSolution.not_found()
 
@@ -236,11 +903,508 @@ def get_optimal_topology_for_a_single_track(network: nx.DiGraph, track: Track) -
     max_delay = max(track.delay_budget + prob.constraints[f"delay_budget_for_{stream}"].value() for stream in track.streams.keys())
     used_links = [link for link, var in link_usages.items()
                   if var.varValue > 0]
-    return SingleTrackSolution.found(cost, max_delay, used_links)
+    solution = SingleTrackSolution.found(cost, max_delay, used_links, lower_bound)
+    solution.timings = timings
+    return solution
+
+
+# The ILP of get_optimal_topology_for_a_single_track, kept alive between the solves of the same track.
+# For a fixed network, only the streams change when subscribers join or leave, so instead of rebuilding the whole
+# problem every time, only the variables and constraints of the affected streams are created or dropped.
+# The previous topology (extended with the new, or pruned from the departed subscribers) is kept as an incumbent,
+# so that every re-solve is warm started from it.
+class IncrementalTrackModel:
+    def __init__(self, network: nx.DiGraph, track: Track, backend: SolverBackendType | None = None):
+        self.network = network
+        self.track = track
+        self.publisher = track.publisher
+        self.delay_budget = track.delay_budget
+        self.backend = backend
+
+        # yij == y_{link}; yij >= 0 constraint is always satisfied
+        self.link_usages = lp.LpVariable.dicts(
+            "y", network.edges, 0, None, cat=lp.LpContinuous)
+
+        # Objective function
+        self.objective = lp.lpSum([data["cost"] * self.link_usages[(node1, node2)] for node1, node2, data
+                                   in network.edges(data=True)])
+
+        # The variables and the constraints of the streams, keyed by the subscriber they are going to
+        self.stream_ids: dict[str, str] = {}
+        self.transmission_bitrates: dict[str, dict] = {}
+        self.selected_links: dict[str, dict] = {}
+        self.constraints: dict[str, dict[str, lp.LpConstraint]] = {}
+        self.next_stream_number = 1
+
+        self.solution: SingleTrackSolution | None = None
+
+        self.sync(track)
+
+    def add_stream(self, subscriber: str):
+        index = get_network_index(self.network)
+
+        # Stream ids are never reused, so that the names of the variables of a departed stream can't clash
+        stream = f"f{self.next_stream_number}"
+        self.next_stream_number += 1
+
+        # xfij == x_{stream}_{link}; xfij >= 0 constraint is always satisfied
+        transmission_bitrates = lp.LpVariable.dicts(
+            f"x_{stream}", self.network.edges, 0, None, cat=lp.LpContinuous)
+
+        # zfij == z_{stream}_{link}; zij == 0 or 1
+        selected_links = lp.LpVariable.dicts(
+            f"z_{stream}", self.network.edges, 0, 1, cat=lp.LpBinary)
+
+        exclude_unusable_links(self.network, self.publisher, subscriber, self.delay_budget,
+                               transmission_bitrates, selected_links)
+
+        constraints = {}
+
+        # Constraint: yij >= xfij
+        for link in self.network.edges:
+            constraints[f"y_({link[0]},{link[1]})>=x_{stream}_({link[0]},{link[1]})"] = \
+                self.link_usages[link] >= transmission_bitrates[link]
+
+        # Constraint: sum(xfji) - sum(xfij) == Rfi
+        reliabilities = {self.publisher: -1, subscriber: 1}
+        for v, node in enumerate(index.nodes):
+            in_going = lp.lpSum([transmission_bitrates[(index.nodes[u], node)] for u in index.in_neighbours[v]])
+            out_going = lp.lpSum([transmission_bitrates[(node, index.nodes[w])] for w in index.costs[v]])
+            constraints[f"nodal_balance_for_{stream}_{node}"] = in_going - out_going == reliabilities.get(node, 0)
+
+        # Constraint: zfij >= xfij
+        # Every stream carries a single unit, so (after cancelling the circulations) xfij <= 1, and M == 1 suffices
+        for link in self.network.edges:
+            constraints[f"z_{stream}_({link[0]},{link[1]})>=x_{stream}_({link[0]},{link[1]})"] = \
+                selected_links[link] >= transmission_bitrates[link]
+
+        # Constraint: sum(zfij * dij) <= D
+        constraints[f"delay_budget_for_{stream}"] = \
+            lp.lpSum([selected_links[(node1, node2)] * data["latency"]
+                      for node1, node2, data in self.network.edges(data=True)]) <= self.delay_budget
+
+        self.stream_ids[subscriber] = stream
+        self.transmission_bitrates[subscriber] = transmission_bitrates
+        self.selected_links[subscriber] = selected_links
+        self.constraints[subscriber] = constraints
+
+    def remove_stream(self, subscriber: str):
+        del self.stream_ids[subscriber]
+        del self.transmission_bitrates[subscriber]
+        del self.selected_links[subscriber]
+        del self.constraints[subscriber]
+
+    # Brings the streams of the model in line with the subscribers of the track (which must have the same publisher
+    # and delay budget as the one the model was created for)
+    def sync(self, track: Track):
+        if track.publisher != self.publisher or track.delay_budget != self.delay_budget:
+            raise ValueError("The model belongs to a track with a different publisher or delay budget.")
+        self.track = track
+
+        for subscriber in self.stream_ids.keys() - track.subscribers:
+            self.remove_stream(subscriber)
+            if self.solution is not None:
+                self.solution = prune_tree(self.network, track, self.solution, subscriber)
+
+        for subscriber in track.subscribers - self.stream_ids.keys():
+            self.add_stream(subscriber)
+            if self.solution is not None:
+                self.solution = extend_tree(self.network, track, self.solution, subscriber)
+                if not self.solution.success:
+                    self.solution = None
+
+    # Sets the initial values of the variables according to a tree shaped solution reaching every subscriber
+    def set_initial_values(self, solution: SingleTrackSolution):
+        used_links = set(solution.used_links)
+        for link, var in self.link_usages.items():
+            var.setInitialValue(1 if link in used_links else 0)
+
+        previous_in_tree = {node2: node1 for node1, node2 in solution.used_links}
+        for subscriber in self.stream_ids.keys():
+            path = set()
+            node = subscriber
+            while node != self.publisher:
+                path.add((previous_in_tree[node], node))
+                node = previous_in_tree[node]
+            for link in self.network.edges:
+                value = 1 if link in path else 0
+                self.transmission_bitrates[subscriber][link].setInitialValue(value)
+                self.selected_links[subscriber][link].setInitialValue(value)
+
+    # Solves the model of the current streams, starting from the given incumbent (or, by default, from the previous
+    # topology adjusted to the changes of the track since then)
+    def solve(self, incumbent: SingleTrackSolution | None = None, time_limit: float | None = None,
+              gap: float | None = None) -> SingleTrackSolution:
+        start = time.time()
+
+        # Only the (already built) constraints are collected here, none of the expressions are rebuilt
+        prob = lp.LpProblem("MoQ_relay_topology_optimization", lp.LpMinimize)
+        prob += self.objective, "total_link_usage"
+        for constraints in self.constraints.values():
+            for name, constraint in constraints.items():
+                prob += constraint, name
+
+        if incumbent is None or not incumbent.success:
+            incumbent = self.solution
+        reached = {node for _, node in incumbent.used_links} if incumbent is not None else set()
+        warm_start = incumbent is not None and self.stream_ids.keys() <= reached
+        if warm_start:
+            self.set_initial_values(incumbent)
+
+        built = time.time()
+        success, lower_bound = solve_problem(prob, remaining_time(start, time_limit), gap,
+                                             warm_start=warm_start, backend=self.backend)
+        timings = {"build": built - start, "solve": time.time() - built}
+        if not success:
+            return SingleTrackSolution.not_found()
+
+        cost = prob.objective.value()
+        max_delay = max((self.delay_budget + prob.constraints[f"delay_budget_for_{stream}"].value()
+                         for stream in self.stream_ids.values()), default=0.0)
+        used_links = [link for link, var in self.link_usages.items()
+                      if var.varValue > 0]
+        solution = SingleTrackSolution.found(cost, max_delay, used_links, lower_bound)
+        solution.timings = timings
+
+        # The raw links of the ILP might not form a tree, so the incumbent is taken from the tree spanned by them
+        self.solution = MulticastTree.from_solution(self.network, self.track, solution).to_solution()
+        return solution
+
+
+# Spectrum::Right - Optimal in cost while keeping the delay constraints (using a compact formulation)
+# Instead of routing a separate stream to every subscriber, the tree is modelled directly as a directed Steiner
+# arborescence rooted at the publisher: every subscriber gets exactly one incoming link, a single commodity flow
+# (of one unit per subscriber) keeps the tree connected, and the delay budget is enforced by the arrival time of
+# the content at each node. This takes O(|links| + |nodes|) variables (instead of O(|subscribers| * |links|)),
+# and the big-M coefficients are the tightest possible ones (|S| and D + dij - tj_min) instead of 1e4.
+def get_optimal_topology_for_a_single_track_compact(network: nx.DiGraph, track: Track,
+                                                    warm_start: 'SingleTrackOptimizerType | None' = None,
+                                                    time_limit: float | None = None,
+                                                    gap: float | None = None,
+                                                    backend: SolverBackendType | None = None) -> SingleTrackSolution:
+    if not is_feasible(network, track):
+        return SingleTrackSolution.not_found()
+
+    start = time.time()
+
+    prob = lp.LpProblem("MoQ_relay_topology_optimization_compact", lp.LpMinimize)
+
+    index = get_network_index(network)
+
+    # Links going into the publisher can never be part of the tree, and neither can the ones that are too slow to be
+    # on the way to any of the subscribers (along with the relays that are only reachable through such links)
+    usable_links = index.usable_links(track.publisher, list(track.subscribers), track.delay_budget).any(axis=0)
+    links = [link for link, usable in zip(index.edges, usable_links) if usable and link[1] != track.publisher]
+    reached_nodes = {node2 for _, node2 in links}
+    nodes = [node for node in index.nodes if node == track.publisher or node in reached_nodes]
+
+    # The content cannot arrive to a node sooner than through the path with the lowest latency
+    latency_distances, _ = index.latency_shortest_paths
+    root = index.node_ids[track.publisher]
+    earliest_arrival_times = {node: min(latency_distances[root, index.node_ids[node]], track.delay_budget)
+                              for node in nodes}
+
+    # yij == y_{link}; yij == 0 or 1
+    selected_links = lp.LpVariable.dicts(
+        "y", links, 0, 1, cat=lp.LpBinary)
+
+    # fij == f_{link}; fij >= 0 constraint is always satisfied
+    flows = lp.LpVariable.dicts(
+        "f", links, 0, None, cat=lp.LpContinuous)
+
+    # ti == t_{node}; ti_min <= ti <= D
+    arrival_times = {node: lp.LpVariable(f"t_{node}", earliest_arrival_times[node], track.delay_budget, cat=lp.LpContinuous)
+                     for node in nodes}
+
+    # Objective function
+    prob += lp.lpSum([network.edges[link]["cost"] * selected_links[link] for link in links]), "total_link_usage"
+
+    in_going, out_going = defaultdict(list), defaultdict(list)
+    for link in links:
+        in_going[link[1]].append(link)
+        out_going[link[0]].append(link)
+
+    # Constraint: sum(yji) == 1 for subscribers, sum(yji) <= 1 for relays
+    for node in nodes:
+        if node == track.publisher:
+            continue
+        if node in track.subscribers:
+            prob += lp.lpSum([selected_links[link] for link in in_going[node]]) == 1, f"in_degree_of_{node}"
+        else:
+            prob += lp.lpSum([selected_links[link] for link in in_going[node]]) <= 1, f"in_degree_of_{node}"
+
+    # Constraint: yij <= sum(yki), i.e., relays only forward the content they receive
+    for node1, node2 in links:
+        if node1 != track.publisher:
+            prob += selected_links[(node1, node2)] <= lp.lpSum([selected_links[link] for link in in_going[node1]]), \
+                f"forwarding_({node1},{node2})"
+
+    # Constraint: sum(fji) - sum(fij) == 1 for subscribers, 0 for relays
+    for node in nodes:
+        if node == track.publisher:
+            continue
+        prob += lp.lpSum([flows[link] for link in in_going[node]]) - lp.lpSum([flows[link] for link in out_going[node]]) == \
+            (1 if node in track.subscribers else 0), f"flow_balance_for_{node}"
+
+    # Constraint: fij <= |S| * yij
+    for link in links:
+        prob += flows[link] <= len(track.subscribers) * selected_links[link], f"f_({link[0]},{link[1]})<=|S|*y_({link[0]},{link[1]})"
+
+    # Constraint: tj >= ti + dij - (D + dij - tj_min) * (1 - yij)
+    prob += arrival_times[track.publisher] == 0, "arrival_time_of_publisher"
+    for node1, node2 in links:
+        latency = network.edges[node1, node2]["latency"]
+        prob += arrival_times[node2] >= arrival_times[node1] + latency - \
+            (track.delay_budget + latency - earliest_arrival_times[node2]) * (1 - selected_links[(node1, node2)]), \
+            f"arrival_time_({node1},{node2})"
+
+    # Seed the solver with the solution of a (much faster) heuristic, if asked to
+    initial_solution = None
+    if warm_start is not None:
+        initial_solution = get_single_track_optimizer(warm_start)(network, track)
+        if initial_solution.success:
+            used_links = set(initial_solution.used_links)
+            for link, var in selected_links.items():
+                var.setInitialValue(1 if link in used_links else 0)
+            latencies = tree_latencies(network, track.publisher, initial_solution.used_links)
+            for node, var in arrival_times.items():
+                var.setInitialValue(latencies.get(node, earliest_arrival_times[node]))
+            paths = paths_in_tree(track, initial_solution)
+            subscribers_behind = {link: 0 for link in links}
+            for path in paths.values():
+                for link in path:
+                    subscribers_behind[link] += 1
+            for link, var in flows.items():
+                var.setInitialValue(subscribers_behind[link])
+
+    built = time.time()
+    success, lower_bound = solve_problem(prob, remaining_time(start, time_limit), gap,
+                                         warm_start=initial_solution is not None and initial_solution.success,
+                                         backend=backend)
+    timings = {"build": built - start, "solve": time.time() - built}
+    if not success:
+        return SingleTrackSolution.not_found()
+
+    # Arrival times might have some slack in them, so the actual delays are calculated from the selected links
+    used_links = [link for link, var in selected_links.items() if var.varValue > 0.5]
+    multicast_tree = MulticastTree.from_solution(network, track, SingleTrackSolution.found(0.0, 0.0, used_links))
+
+    # Links without any cost might be selected even if they don't lead to any subscriber
+    for node in multicast_tree.subtree_in_tree(track.publisher):
+        if multicast_tree.contains(node):
+            multicast_tree.prune(node)
+
+    solution = multicast_tree.to_solution()
+    solution.lower_bound = lower_bound
+    solution.timings = timings
+    return solution
+
+
+# Spectrum::Right - Optimal in cost while keeping the delay constraints (using a sparse matrix model)
+# The same formulation as get_optimal_topology_for_a_single_track, but the constraint matrix is assembled directly
+# from the edge arrays of the network index (instead of through PuLP's expressions), and it is solved in-process
+# by HiGHS (which is the only backend it supports). Since HiGHS cannot be given an incumbent, the warm start solution is only used as a fallback,
+# i.e., when the solver cannot find a better one within the time limit.
+def get_optimal_topology_for_a_single_track_sparse(network: nx.DiGraph, track: Track,
+                                                   warm_start: 'SingleTrackOptimizerType | None' = None,
+                                                   time_limit: float | None = None,
+                                                   gap: float | None = None,
+                                                   backend: SolverBackendType | None = SolverBackendType.HIGHS) -> SingleTrackSolution:
+    if not is_feasible(network, track):
+        return SingleTrackSolution.not_found()
+
+    start = time.time()
+
+    model = build_single_track_milp(network, track)
+
+    built = time.time()
+    result = solve_milp(model, remaining_time(start, time_limit), gap)
+    timings = {"build": built - start, "solve": time.time() - built}
+
+    lower_bound = getattr(result, "mip_dual_bound", None)
+    if result.x is None:
+        solution = SingleTrackSolution.not_found()
+    else:
+        index = get_network_index(network)
+        number_of_stream_links = len(track.streams) * index.number_of_edges
+
+        link_usages = result.x[number_of_stream_links:number_of_stream_links + index.number_of_edges]
+        selected_links = result.x[number_of_stream_links + index.number_of_edges:].reshape(len(track.streams), -1)
+
+        cost = result.fun
+        max_delay = float(np.max((selected_links > 0.5) @ index.edge_latencies))
+        used_links = [index.edges[i] for i in np.flatnonzero(link_usages > 1e-6)]
+        solution = SingleTrackSolution.found(cost, max_delay, used_links, lower_bound)
+
+    initial_solution = None
+    if warm_start is not None:
+        initial_solution = get_single_track_optimizer(warm_start)(network, track)
+    if initial_solution is not None and initial_solution.success and \
+            (not solution.success or initial_solution.cost < solution.cost):
+        solution = SingleTrackSolution.found(*list(initial_solution)[1:], lower_bound)
+
+    solution.timings = timings
+    return solution
+
+
+# The cheaper of the trees of the heuristics that scale to the whole network (neither of which is always the cheaper one)
+def heuristic_backbone(network: nx.DiGraph, track: Track) -> SingleTrackSolution:
+    solutions = [solution for solution in (multicast_heuristic(network, track), delay_constrained_steiner_tree(network, track))
+                 if solution.success]
+    return min(solutions, key=lambda solution: solution.cost, default=SingleTrackSolution.not_found())
+
+
+# Spectrum::Left - Approximately optimal in cost while keeping the delay constraints (using region clustering)
+# A two-level optimization for networks that are too large to be optimized as a whole (e.g., by the ILPs):
+# 1. A backbone tree of the whole track is found by `backbone_strategy`, which has to scale to the whole network (by
+#    default, it's the cheaper of the trees of the multicast heuristic and the delay-constrained Steiner tree).
+# 2. The nodes are clustered by their location, and the part of the backbone within every cluster (i.e., the links
+#    going into its nodes) is optimized again by `strategy`. The content enters a cluster through the heads, i.e.,
+#    the nodes that forward it out of their own cluster in the backbone, at the time the backbone delivers it to them,
+#    and the heads of the cluster itself have to get it no later than in the backbone. This splits the delay budget
+#    between the levels, so that the clusters can be optimized independently of each other (in parallel, by at most
+#    `max_workers` processes), on networks of about the size of a cluster.
+# 3. The part of the backbone within a cluster is only replaced by its optimized tree if that is cheaper, so the result
+#    is never more expensive than the backbone itself.
+# The strategies have to be picklable, e.g., functions of this module, or functools.partials of them.
+def hierarchical_tree(network: nx.DiGraph, track: Track,
+                      strategy: Callable[[nx.DiGraph, Track], SingleTrackSolution] = delay_constrained_steiner_tree,
+                      backbone_strategy: Callable[[nx.DiGraph, Track], SingleTrackSolution] = heuristic_backbone,
+                      number_of_clusters: int | None = None,
+                      max_workers: int | None = None) -> SingleTrackSolution:
+    if not is_feasible(network, track):
+        return SingleTrackSolution.not_found()
+
+    start = time.time()
+
+    backbone = backbone_strategy(network, track)
+    if not backbone.success:
+        return backbone
+    backbone = MulticastTree.from_solution(network, track, backbone).to_solution()
+    arrival_times = tree_latencies(network, track.publisher, backbone.used_links)
+
+    clusters = cluster_by_location(network, number_of_clusters or round(math.sqrt(network.number_of_nodes())))
+    cluster_of = {node: cluster for cluster, nodes in enumerate(clusters) for node in nodes}
+    heads = {track.publisher, *(node1 for node1, node2 in backbone.used_links if cluster_of[node1] != cluster_of[node2])}
+
+    backbone_links_of = {}
+    for node1, node2 in backbone.used_links:
+        backbone_links_of.setdefault(cluster_of[node2], []).append((node1, node2))
+
+    cluster_networks, cluster_tracks = {}, {}
+    for cluster in backbone_links_of:
+        cluster_networks[cluster], cluster_tracks[cluster] = cluster_problem(network, track, clusters[cluster], heads,
+                                                                             arrival_times)
+    cluster_solutions = optimize_clusters(strategy, cluster_networks, cluster_tracks, max_workers)
+
+    used_links = []
+    for cluster, backbone_links in backbone_links_of.items():
+        solution = cluster_solutions[cluster]
+        backbone_cost = sum(network.edges[link]["cost"] for link in backbone_links)
+        if solution.success and solution.cost < backbone_cost:
+            used_links.extend(link for link in solution.used_links if link[0] in network and link[1] in network)
+        else:
+            used_links.extend(backbone_links)
+
+    multicast_tree = MulticastTree.from_solution(network, track, SingleTrackSolution.found(0.0, 0.0, used_links))
+    for node in multicast_tree.subtree_in_tree(track.publisher):
+        if multicast_tree.contains(node):
+            multicast_tree.prune(node)
+
+    solution = multicast_tree.to_solution()
+    if not all(multicast_tree.contains(subscriber) for subscriber in track.subscribers) or \
+            solution.max_delay > track.delay_budget + LATENCY_TOLERANCE or solution.cost >= backbone.cost:
+        solution = backbone
+    solution.timings = {"solve": time.time() - start}
+    return solution
+
+
+# The track of a cluster (see hierarchical_tree) starts at a virtual source, which has a link to every head outside of
+# the cluster (and to the publisher, if it's in the cluster) with the latency of the content's arrival to it. The heads
+# of the cluster get a virtual subscriber behind a link with the latency that they can be late by (compared to the
+# budget), in order to get the content no later than in the backbone.
+def cluster_problem(network: nx.DiGraph, track: Track, nodes: list[str], heads: set[str],
+                    arrival_times: dict[str, float]) -> tuple[nx.DiGraph, Track]:
+    cluster_network = nx.DiGraph(network.subgraph(nodes))
+    source = f"{track.publisher}/backbone"
+
+    if track.publisher in cluster_network:
+        cluster_network.add_edge(source, track.publisher, cost=0.0, latency=0.0)
+    for head in heads:
+        if head in cluster_network:
+            continue
+        cluster_network.add_edge(source, head, cost=0.0, latency=arrival_times[head])
+        cluster_network.add_edges_from((head, node, network.edges[head, node]) for node in network.successors(head)
+                                       if node in cluster_network and node != track.publisher)
+
+    subscribers = [node for node in nodes if node in track.subscribers]
+    for head in heads:
+        if head in cluster_network and head != track.publisher:
+            virtual_subscriber = f"{head}/head"
+            cluster_network.add_edge(head, virtual_subscriber, cost=0.0,
+                                     latency=max(track.delay_budget - arrival_times[head], 0.0))
+            subscribers.append(virtual_subscriber)
+
+    return cluster_network, Track(source, subscribers, track.delay_budget)
+
+
+# Optimizes the track of every cluster on the network of the cluster, in parallel if more than one worker is allowed
+def optimize_clusters(strategy: Callable[[nx.DiGraph, Track], SingleTrackSolution], networks: dict[int, nx.DiGraph],
+                      tracks: dict[int, Track], max_workers: int | None = None) -> dict[int, SingleTrackSolution]:
+    workers = min(max_workers or os.cpu_count() or 1, len(tracks))
+    if workers <= 1:
+        return {cluster: strategy(networks[cluster], track) for cluster, track in tracks.items()}
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = {cluster: executor.submit(strategy, networks[cluster], track)
+                   for cluster, track in tracks.items()}
+        return {cluster: future.result() for cluster, future in futures.items()}
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Groups the nodes into (at most) `number_of_clusters` clusters with k-means on their location (as points of the unit
+# sphere, so that the clusters don't fall apart at the antimeridian). The initial centers are picked farthest first,
+# starting from the first node, which keeps the clustering of a network deterministic.
+def cluster_by_location(network: nx.DiGraph, number_of_clusters: int, max_iterations: int = 100) -> list[list[str]]:
+    nodes = list(network.nodes)
+    number_of_clusters = max(1, min(number_of_clusters, len(nodes)))
+
+    latitudes, longitudes = np.radians(np.array([network.nodes[node]["location"] for node in nodes], dtype=np.float64)).T
+    points = np.column_stack([np.cos(latitudes) * np.cos(longitudes), np.cos(latitudes) * np.sin(longitudes),
+                              np.sin(latitudes)])
+
+    centers = [points[0]]
+    distances = np.linalg.norm(points - points[0], axis=1)
+    for _ in range(number_of_clusters - 1):
+        centers.append(points[int(np.argmax(distances))])
+        distances = np.minimum(distances, np.linalg.norm(points - centers[-1], axis=1))
+    centers = np.array(centers)
+
+    assignments = None
+    for _ in range(max_iterations):
+        new_assignments = np.argmin(np.linalg.norm(points[:, None, :] - centers[None, :, :], axis=2), axis=1)
+        if assignments is not None and np.array_equal(assignments, new_assignments):
+            break
+        assignments = new_assignments
+        for cluster in range(number_of_clusters):
+            members = points[assignments == cluster]
+            # Clusters that have lost all of their nodes keep their center
+            if len(members):
+                centers[cluster] = members.mean(axis=0)
+
+    clusters = [[] for _ in range(number_of_clusters)]
+    for node, cluster in zip(nodes, assignments):
+        clusters[cluster].append(node)
+    return [cluster for cluster in clusters if cluster]
 
 
 # Spectrum::RightMost - Optimal in cost
 def minimum_spanning_tree(network: nx.DiGraph, track: Track) -> SingleTrackSolution:
+    if not is_feasible(network, track):
+        return SingleTrackSolution.not_found()
+
     network = network.to_undirected()
     network.remove_nodes_from(
         set(network.nodes) - {track.publisher, *track.subscribers})
@@ -264,30 +1428,177 @@ def minimum_spanning_tree(network: nx.DiGraph, track: Track) -> SingleTrackSolut
     return SingleTrackSolution.found(cost, max_delay, list(mst_from_publisher.edges))
 
 
+# Spectrum::Right - The cheapest of the solutions of several optimizers, within a deadline
+# Which optimizer wins depends on the size of the track and on its delay budget, so the strategies are raced against
+# each other, each in its own worker process. Once all of them have finished, or the deadline (in seconds) has passed,
+# the cheapest feasible solution is returned. Every worker leads its own process group, so that killing the group of an
+# unfinished worker also kills the solver processes (e.g., CBC) it has started, and keeps its temporary files in a
+# directory of the portfolio, so that the files of the killed solvers are removed as well.
+def portfolio_tree(network: nx.DiGraph, track: Track,
+                   strategies: list[Callable[[nx.DiGraph, Track], SingleTrackSolution]],
+                   deadline: float | None = None) -> SingleTrackSolution:
+    if not is_feasible(network, track):
+        return SingleTrackSolution.not_found()
+
+    start = time.time()
+
+    with tempfile.TemporaryDirectory(prefix="portfolio-") as temporary_directory:
+        workers = []
+        for strategy in strategies:
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=_run_in_process_group,
+                                              args=(strategy, network, track, sender, temporary_directory), daemon=True)
+            process.start()
+            sender.close()
+            workers.append((process, receiver))
+
+        solutions = [None] * len(workers)
+        pending = {receiver: i for i, (_, receiver) in enumerate(workers)}
+        try:
+            while pending:
+                ready = multiprocessing.connection.wait(list(pending), remaining_time(start, deadline))
+                if not ready:
+                    break
+                for receiver in ready:
+                    i = pending.pop(receiver)
+                    try:
+                        solutions[i] = receiver.recv()
+                    except EOFError:
+                        # The worker has died without a solution
+                        solutions[i] = SingleTrackSolution.not_found()
+        finally:
+            for process, receiver in workers:
+                if process.is_alive():
+                    try:
+                        os.killpg(process.pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        # The worker hasn't got to create its process group yet
+                        pass
+                    process.kill()
+                process.join()
+                receiver.close()
+
+    found = [solution for solution in solutions if solution is not None and solution.success]
+    if not found:
+        return SingleTrackSolution.not_found()
+
+    # Ties are broken by the order of the strategies, and the best lower bound proven by any of them is kept
+    solution = min(found, key=lambda solution: solution.cost)
+    lower_bounds = [solution.lower_bound for solution in solutions if solution is not None and solution.lower_bound is not None]
+    solution.lower_bound = max(lower_bounds, default=None)
+    solution.timings = {"solve": time.time() - start}
+    return solution
+
+
+def _run_in_process_group(strategy: Callable[[nx.DiGraph, Track], SingleTrackSolution], network: nx.DiGraph,
+                          track: Track, sender: multiprocessing.connection.Connection, temporary_directory: str):
+    os.setpgrp()
+    # Both PuLP and the tempfile module (used for the logs of CBC) go by TMPDIR
+    os.environ["TMPDIR"] = tempfile.tempdir = temporary_directory
+    sender.send(strategy(network, track))
+    sender.close()
+
+
 class SingleTrackOptimizerType(str, Enum):
     DIRECT_LINK_TREE = "direct_link_tree"
     MULTICAST_HEURISTIC = "multicast_heuristic"
+    DELAY_CONSTRAINED_STEINER_TREE = "delay_constrained_steiner_tree"
+    LAGRANGIAN_RELAXATION = "lagrangian_relaxation"
     INTEGER_LINEAR_PROGRAMMING = "integer_linear_programming"
+    COMPACT_INTEGER_LINEAR_PROGRAMMING = "compact_integer_linear_programming"
+    SPARSE_INTEGER_LINEAR_PROGRAMMING = "sparse_integer_linear_programming"
     MINIMUM_SPANNING_TREE = "minimum_spanning_tree"
+    HIERARCHICAL = "hierarchical"
+    PORTFOLIO = "portfolio"
+
+
+ILP_OPTIMIZER_TYPES = {
+    SingleTrackOptimizerType.INTEGER_LINEAR_PROGRAMMING: get_optimal_topology_for_a_single_track,
+    SingleTrackOptimizerType.COMPACT_INTEGER_LINEAR_PROGRAMMING: get_optimal_topology_for_a_single_track_compact,
+    SingleTrackOptimizerType.SPARSE_INTEGER_LINEAR_PROGRAMMING: get_optimal_topology_for_a_single_track_sparse,
+}
+
+# The optimizers that an ILP can be warm started with, i.e., the heuristics (the others solve ILPs themselves)
+WARM_START_OPTIMIZER_TYPES = (
+    SingleTrackOptimizerType.DIRECT_LINK_TREE,
+    SingleTrackOptimizerType.MULTICAST_HEURISTIC,
+    SingleTrackOptimizerType.DELAY_CONSTRAINED_STEINER_TREE,
+    SingleTrackOptimizerType.LAGRANGIAN_RELAXATION,
+    SingleTrackOptimizerType.MINIMUM_SPANNING_TREE,
+)
 
+# Options (passed as keyword arguments) that are understood by the ILP based optimizers
+ILP_OPTIONS = ("warm_start", "time_limit", "gap", "backend")
 
-def get_single_track_optimizer(type: SingleTrackOptimizerType) -> Callable[[nx.DiGraph, Track], SingleTrackSolution]:
+# Unless they are given other options, the ILPs of the clusters (see hierarchical_tree) start from the heuristic and
+# stop after this many seconds, so that a cluster too large to be solved to optimality falls back to its best tree
+HIERARCHICAL_CLUSTER_TIME_LIMIT = 10.0
+
+DEFAULT_PORTFOLIO = (
+    SingleTrackOptimizerType.MULTICAST_HEURISTIC,
+    SingleTrackOptimizerType.MINIMUM_SPANNING_TREE,
+    SingleTrackOptimizerType.INTEGER_LINEAR_PROGRAMMING,
+)
+
+
+def get_single_track_optimizer(type: SingleTrackOptimizerType, **kwargs) -> Callable[[nx.DiGraph, Track], SingleTrackSolution]:
     if type == SingleTrackOptimizerType.DIRECT_LINK_TREE:
         return direct_link_tree
     elif type == SingleTrackOptimizerType.MULTICAST_HEURISTIC:
         return multicast_heuristic
-    elif type == SingleTrackOptimizerType.INTEGER_LINEAR_PROGRAMMING:
-        return get_optimal_topology_for_a_single_track
+    elif type == SingleTrackOptimizerType.DELAY_CONSTRAINED_STEINER_TREE:
+        return delay_constrained_steiner_tree
+    elif type == SingleTrackOptimizerType.LAGRANGIAN_RELAXATION:
+        return lagrangian_relaxation_tree
+    elif type in ILP_OPTIMIZER_TYPES:
+        if kwargs.get("warm_start") not in (None, *WARM_START_OPTIMIZER_TYPES):
+            raise ValueError("An ILP can only be warm started by a heuristic.")
+        if type == SingleTrackOptimizerType.SPARSE_INTEGER_LINEAR_PROGRAMMING and \
+                kwargs.get("backend") not in (None, SolverBackendType.HIGHS):
+            raise ValueError("The sparse ILP can only be solved by HiGHS.")
+        options = {key: kwargs[key] for key in ILP_OPTIONS if kwargs.get(key) is not None}
+        if not options:
+            return ILP_OPTIMIZER_TYPES[type]
+        return functools.partial(ILP_OPTIMIZER_TYPES[type], **options)
     elif type == SingleTrackOptimizerType.MINIMUM_SPANNING_TREE:
         return minimum_spanning_tree
+    elif type == SingleTrackOptimizerType.HIERARCHICAL:
+        # The clusters are optimized by the (time-limited) sparse ILP by default, which gets the options of the ILPs (and
+        # so does the backbone optimizer, if one is given instead of the default heuristics)
+        cluster_optimizer = kwargs.get("cluster_optimizer") or SingleTrackOptimizerType.SPARSE_INTEGER_LINEAR_PROGRAMMING
+        backbone_optimizer = kwargs.get("backbone_optimizer")
+        if SingleTrackOptimizerType.HIERARCHICAL in (cluster_optimizer, backbone_optimizer):
+            raise ValueError("The levels cannot be optimized hierarchically.")
+        ilp_options = {key: kwargs[key] for key in ILP_OPTIONS if kwargs.get(key) is not None}
+        strategy = get_single_track_optimizer(cluster_optimizer,
+                                              **{"warm_start": SingleTrackOptimizerType.MULTICAST_HEURISTIC,
+                                                 "time_limit": HIERARCHICAL_CLUSTER_TIME_LIMIT,
+                                                 **ilp_options})
+        backbone_strategy = heuristic_backbone if backbone_optimizer is None else \
+            get_single_track_optimizer(backbone_optimizer, **ilp_options)
+        options = {key: kwargs[key] for key in ("number_of_clusters", "max_workers") if kwargs.get(key) is not None}
+        return functools.partial(hierarchical_tree, strategy=strategy, backbone_strategy=backbone_strategy, **options)
+    elif type == SingleTrackOptimizerType.PORTFOLIO:
+        portfolio = kwargs.get("portfolio") or DEFAULT_PORTFOLIO
+        if SingleTrackOptimizerType.PORTFOLIO in portfolio:
+            raise ValueError("A portfolio cannot contain another portfolio.")
+        # The time limit of the portfolio is its deadline. The ILPs are stopped a bit before it, so that they still
+        # have the time to hand over the best solution they have found by then.
+        deadline = kwargs.get("time_limit")
+        options = {key: kwargs[key] for key in ILP_OPTIONS if key in kwargs}
+        if deadline is not None:
+            options["time_limit"] = 0.9 * deadline
+        strategies = [get_single_track_optimizer(strategy_type, **options) for strategy_type in portfolio]
+        return functools.partial(portfolio_tree, strategies=strategies, deadline=deadline)
     else:
         raise ValueError("Invalid optimizer type.")
 
 
 class MultiTrackSolution:
-    def __init__(self, explicit_success, solutions: dict[str, SingleTrackSolution]):
+    def __init__(self, explicit_success, solutions: dict[str, SingleTrackSolution], explicit_lower_bound: float | None = None):
         self.explicit_success = explicit_success
         self.solutions = solutions
+        self.explicit_lower_bound = explicit_lower_bound
 
     @property
     def success(self) -> bool:
@@ -306,6 +1617,30 @@ class MultiTrackSolution:
         max_delay = max(solution.max_delay for solution in self.solutions.values())
         return max_delay
 
+    @property
+    def lower_bound(self) -> float | None:
+        if not self.explicit_success:
+            return None
+        if self.explicit_lower_bound is not None:
+            return self.explicit_lower_bound
+        lower_bounds = [solution.lower_bound for solution in self.solutions.values()]
+        if None in lower_bounds:
+            return None
+        return sum(lower_bounds)
+
+    @property
+    def gap(self) -> float | None:
+        return relative_gap(self.cost, self.lower_bound) if self.success else None
+
+    # Time spent on the phases of the optimization, summed over the tracks
+    @property
+    def timings(self) -> dict[str, float]:
+        timings = defaultdict(float)
+        for solution in self.solutions.values():
+            for phase, duration in solution.timings.items():
+                timings[phase] += duration
+        return dict(timings)
+
     @property
     def used_links_per_track(self) -> dict[str, list[tuple[str, str]]]:
         if not self.explicit_success:
@@ -316,15 +1651,55 @@ class MultiTrackSolution:
         yield from (self.success, self.cost, self.max_delay, self.used_links_per_track)
 
     @staticmethod
-    def found(solutions: dict[str, SingleTrackSolution]) -> 'MultiTrackSolution':
-        return MultiTrackSolution(True, solutions)
+    def found(solutions: dict[str, SingleTrackSolution], lower_bound: float | None = None) -> 'MultiTrackSolution':
+        return MultiTrackSolution(True, solutions, lower_bound)
 
     @staticmethod
     def not_found() -> 'MultiTrackSolution':
         return MultiTrackSolution(False, {})
 
 
-def get_optimal_topology_for_multiple_tracks(network: nx.DiGraph, tracks: dict[str, Track]) -> MultiTrackSolution:
+# Links can have a capacity (in the number of tracks they can carry), which is the only thing that couples the tracks
+def coupling_links(network: nx.DiGraph, tracks: dict[str, Track]) -> list[tuple[str, str]]:
+    # A track never needs to send its content through the same link more than once,
+    # so a capacity that is at least the number of tracks can never be exceeded
+    return [(node1, node2) for node1, node2, capacity in network.edges(data="capacity")
+            if capacity is not None and capacity < len(tracks)]
+
+
+# Without any coupling between the tracks, the joint problem is just the union of the problems of the tracks,
+# which are much smaller (and can be solved in parallel) on their own. The monolithic model is only built if there
+# are links with a limited capacity.
+def get_optimal_topology_for_multiple_tracks(network: nx.DiGraph, tracks: dict[str, Track],
+                                             time_limit: float | None = None,
+                                             gap: float | None = None,
+                                             backend: SolverBackendType | None = None,
+                                             max_workers: int | None = None) -> MultiTrackSolution:
+    if not all(is_feasible(network, track) for track in tracks.values()):
+        return MultiTrackSolution.not_found()
+
+    if coupling_links(network, tracks):
+        return get_optimal_topology_for_multiple_tracks_monolithic(network, tracks, time_limit, gap, backend)
+
+    workers = min(max_workers or os.cpu_count() or 1, len(tracks))
+    if time_limit is not None and workers > 0:
+        # The tracks are solved in rounds of `workers`, which together have to fit in the time limit
+        time_limit /= math.ceil(len(tracks) / workers)
+    options = {key: value for key, value in (("time_limit", time_limit), ("gap", gap), ("backend", backend))
+               if value is not None}
+    single_track_optimizer = functools.partial(get_optimal_topology_for_a_single_track, **options)
+
+    if workers <= 1:
+        return multi_to_single_track_adapter_factory(single_track_optimizer)(network, tracks)
+    return parallel_multi_to_single_track_adapter_factory(single_track_optimizer, workers)(network, tracks)
+
+
+def get_optimal_topology_for_multiple_tracks_monolithic(network: nx.DiGraph, tracks: dict[str, Track],
+                                                        time_limit: float | None = None,
+                                                        gap: float | None = None,
+                                                        backend: SolverBackendType | None = None) -> MultiTrackSolution:
+    start = time.time()
+
     prob = lp.LpProblem("MoQ_relay_topology_optimization", lp.LpMinimize)
 
     # xftij == x_{track}_{stream}_{link}; xftij >= 0 constraint is always satisfied
@@ -343,6 +1718,11 @@ def get_optimal_topology_for_multiple_tracks(network: nx.DiGraph, tracks: dict[s
         selected_links[track_id] = lp.LpVariable.dicts(
             f"z_{track_id}", (track.streams.keys(), network.edges), 0, 1, cat=lp.LpBinary)
 
+    for track_id, track in tracks.items():
+        for stream in track.streams.keys():
+            exclude_unusable_links(network, track.publisher, track.subscriber_of(stream), track.delay_budget,
+                                   transmission_bitrates[track_id][stream], selected_links[track_id][stream])
+
     # Objective function
     prob += lp.lpSum([data["cost"] * link_usages[track_id][(node1, node2)] for node1, node2, data
                      in network.edges(data=True) for track_id in tracks.keys()]), "total_link_usage"
@@ -365,7 +1745,7 @@ def get_optimal_topology_for_multiple_tracks(network: nx.DiGraph, tracks: dict[s
                                     for link in network.edges if link[1] == node])
                 out_going = lp.lpSum([transmission_bitrates[track_id][stream][link]
                                       for link in network.edges if link[0] == node])
-                prob += in_going - out_going == node_reliabilities[node], \
+                prob += in_going - out_going == node_reliabilities.get(node, 0), \
                     f"nodal_balance_for_{track_id}_{stream}_{node}"
 
     # Constraint: zftij*M >= xftij
@@ -383,9 +1763,12 @@ def get_optimal_topology_for_multiple_tracks(network: nx.DiGraph, tracks: dict[s
                               for node1, node2, data in network.edges(data=True)]) <= track.delay_budget, \
                 f"delay_budget_for_{track_id}_{stream}"
 
-    prob.solve(lp.PULP_CBC_CMD(msg=False))
+    # Constraint: sum(ytij) <= Cij, for the links with a limited capacity
+    for node1, node2 in coupling_links(network, tracks):
+        prob += lp.lpSum([link_usages[track_id][(node1, node2)] for track_id in tracks.keys()]) <= \
+            network.edges[node1, node2]["capacity"], f"capacity_of_({node1},{node2})"
 
-    success = prob.status == lp.LpStatusOptimal
+    success, lower_bound = solve_problem(prob, remaining_time(start, time_limit), gap, backend=backend)
     if not success:
         return MultiTrackSolution.not_found()
 
@@ -401,7 +1784,7 @@ def get_optimal_topology_for_multiple_tracks(network: nx.DiGraph, tracks: dict[s
 
         solutions[track_id] = SingleTrackSolution.found(objective, max_delay, used_links)
 
-    return MultiTrackSolution.found(solutions)
+    return MultiTrackSolution.found(solutions, lower_bound)
 
 
 def multi_to_single_track_adapter_factory(strategy: Callable[[nx.DiGraph, Track], SingleTrackSolution]) -> Callable[[nx.DiGraph, Track], MultiTrackSolution]:
@@ -420,9 +1803,59 @@ def multi_to_single_track_adapter_factory(strategy: Callable[[nx.DiGraph, Track]
     return multi_to_single_track_adapter
 
 
+# The network is shipped to every worker process once (when it's started), instead of once for every track
+_worker_network: nx.DiGraph | None = None
+
+
+def _initialize_worker(network: nx.DiGraph):
+    global _worker_network
+    _worker_network = network
+
+
+def _optimize_in_worker(strategy: Callable[[nx.DiGraph, Track], SingleTrackSolution], track: Track) -> SingleTrackSolution:
+    return strategy(_worker_network, track)
+
+
+# Same as multi_to_single_track_adapter_factory, but the tracks are optimized in parallel by a pool of (at most
+# `max_workers`, by default as many as CPUs) processes. The strategy has to be picklable, e.g., a function of this
+# module, or a functools.partial of one.
+# As soon as a track turns out to be infeasible, the tracks that haven't been started yet are cancelled.
+# Devlog: The ones that are already being optimized cannot be interrupted, they are left to finish in the background.
+def parallel_multi_to_single_track_adapter_factory(strategy: Callable[[nx.DiGraph, Track], SingleTrackSolution],
+                                                   max_workers: int | None = None) -> Callable[[nx.DiGraph, Track], MultiTrackSolution]:
+
+    def parallel_multi_to_single_track_adapter(network: nx.DiGraph, tracks: dict[str, Track]) -> MultiTrackSolution:
+        if not tracks:
+            return MultiTrackSolution.found({})
+
+        workers = min(max_workers or os.cpu_count() or 1, len(tracks))
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_initialize_worker, initargs=(network,))
+        try:
+            futures = {track_id: executor.submit(_optimize_in_worker, strategy, track)
+                       for track_id, track in tracks.items()}
+
+            # Infeasible tracks are not exceptions, so every completed track has to be checked as soon as it's done
+            pending = set(futures.values())
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if not future.result().success:
+                        return MultiTrackSolution.not_found()
+
+            # The solutions are collected in the order of the tracks (and not in the order of their completion)
+            solutions = {track_id: future.result() for track_id, future in futures.items()}
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return MultiTrackSolution.found(solutions)
+
+    return parallel_multi_to_single_track_adapter
+
+
 class MultiTrackOptimizerType(str, Enum):
     NATIVE = "native"
     ADAPTED = "adapted"
+    PARALLEL = "parallel"
 
 
 def get_multi_track_optimizer(type: str, **kwargs) -> Callable[[nx.DiGraph, dict[str, Track], bool], MultiTrackSolution]:
@@ -432,7 +1865,16 @@ def get_multi_track_optimizer(type: str, **kwargs) -> Callable[[nx.DiGraph, dict
             raise ValueError(
                 "Single track optimizer must be provided for adapted optimization.")
         return multi_to_single_track_adapter_factory(single_track_optimizer)
+    elif type == MultiTrackOptimizerType.PARALLEL:
+        single_track_optimizer = kwargs.get("single_track_optimizer")
+        if single_track_optimizer is None:
+            raise ValueError(
+                "Single track optimizer must be provided for parallel optimization.")
+        return parallel_multi_to_single_track_adapter_factory(single_track_optimizer, kwargs.get("max_workers"))
     elif type == MultiTrackOptimizerType.NATIVE:
-        return get_optimal_topology_for_multiple_tracks
+        options = {key: kwargs[key] for key in ("time_limit", "gap", "backend", "max_workers") if kwargs.get(key) is not None}
+        if not options:
+            return get_optimal_topology_for_multiple_tracks
+        return functools.partial(get_optimal_topology_for_multiple_tracks, **options)
     else:
         raise ValueError("Invalid optimizer type.")
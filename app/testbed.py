@@ -18,6 +18,7 @@ publisher, *subscribers = peers
 
 optimizer_type = "multicast_heuristic"
 reduce_network = False
+incremental = True
 
 response = requests.post(f"{BASE_URL}/tracks/{track_namespace}", json={
     "publisher": publisher,
@@ -28,7 +29,7 @@ assert response.status_code == 201
 for subscriber in subscribers:
     start = time.time()
     
-    response = requests.post(f"{BASE_URL}/tracks/{track_namespace}/subscription/{subscriber}?optimizer_type={optimizer_type}&reduce_network={reduce_network}")
+    response = requests.post(f"{BASE_URL}/tracks/{track_namespace}/subscription/{subscriber}?optimizer_type={optimizer_type}&reduce_network={reduce_network}&incremental={incremental}")
     assert response.status_code == 200
     
     end = time.time()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules of the app import each other by their plain names (the same way as when they are run from app/)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
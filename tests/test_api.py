@@ -0,0 +1,109 @@
+import asyncio
+import importlib
+import os
+
+import httpx
+import pytest
+
+from solver import SingleTrackOptimizerType
+
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+
+# The API loads its network from the datasource directory relative to the working directory when it's imported
+@pytest.fixture(scope="module")
+def api():
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    try:
+        yield importlib.import_module("api")
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture(autouse=True)
+def clean_state(api):
+    yield
+    for state in (api.tracks, api.topologies, api.topology_versions, api.models, api.pending_joins,
+                  api.ongoing_joins, api.track_locks, api.pending_refinements):
+        state.clear()
+    if api.executor is not None:
+        api.executor.shutdown(cancel_futures=True)
+        api.executor = None
+
+
+# A request cancelled while waiting for the track must not leave its join behind, or an identical request would wait
+# for it forever instead of optimizing
+def test_join_cancelled_while_waiting_for_the_track_is_withdrawn(api):
+    async def scenario():
+        await api.create_track("track", api.TrackDTO(publisher="westeurope", delay_budget=400))
+        lock = api.track_locks["track"]
+        await lock.acquire()
+        request = asyncio.create_task(
+            api.subscribe_all("track", ["eastus"], optimizer_type=SingleTrackOptimizerType.MULTICAST_HEURISTIC))
+        await asyncio.sleep(0)
+        request.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await request
+        lock.release()
+
+        assert not api.pending_joins
+        await asyncio.wait_for(
+            api.subscribe_all("track", ["eastus"], optimizer_type=SingleTrackOptimizerType.MULTICAST_HEURISTIC), 10)
+        assert api.tracks["track"].subscribers == {"eastus"}
+
+    asyncio.run(scenario())
+
+
+def test_track_with_unknown_publisher_is_rejected(api):
+    with pytest.raises(api.HTTPException) as error:
+        asyncio.run(api.create_track("track", api.TrackDTO(publisher="nowhere", delay_budget=400)))
+
+    assert error.value.status_code == 404
+    assert "track" not in api.tracks
+
+
+# The table of a track is served from its creation on, and a relay's cached copy stays valid until the topology changes
+def test_forwarding_table_is_versioned_by_its_topology(api):
+    async def scenario():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://controller") as client:
+            response = await client.post("/tracks/unknown", json={"publisher": "nowhere", "delay_budget": 400})
+            assert response.status_code == 404
+            response = await client.get("/tracks/unknown/forwarding-table")
+            assert response.status_code == 404
+
+            await client.post("/tracks/track", json={"publisher": "westeurope", "delay_budget": 400})
+            response = await client.get("/tracks/track/forwarding-table")
+            publisher = str(api.relay_ids["westeurope"])
+            assert response.json()["relays"] == {publisher: {"upstream": None, "downstream": []}}
+
+            etag = response.headers["ETag"]
+            response = await client.get("/tracks/track/forwarding-table", headers={"If-None-Match": etag})
+            assert response.status_code == 304
+
+            await client.post("/tracks/track/subscription/eastus?optimizer_type=multicast_heuristic")
+            response = await client.get("/tracks/track/forwarding-table", headers={"If-None-Match": etag})
+            assert response.status_code == 200
+            assert response.headers["ETag"] != etag
+            subscriber = str(api.relay_ids["eastus"])
+            assert response.json()["relays"][subscriber]["downstream"] == []
+
+    asyncio.run(scenario())
+
+
+# A refinement without a time limit could keep the other tracks from being refined for as long as its ILP takes
+def test_refinements_are_time_limited_by_default(api):
+    async def scenario():
+        async with api.lifespan(api.app):
+            api.schedule_refinement("track", optimizer_type=SingleTrackOptimizerType.INTEGER_LINEAR_PROGRAMMING)
+            assert api.pending_refinements["track"]["time_limit"] == api.REFINEMENT_TIME_LIMIT
+            assert api.pending_refinements["track"]["gap"] == api.REFINEMENT_GAP
+
+            api.schedule_refinement("track", optimizer_type=SingleTrackOptimizerType.INTEGER_LINEAR_PROGRAMMING,
+                                    time_limit=5)
+            assert api.pending_refinements["track"]["time_limit"] == 5
+            await api.refinement_queue.join()
+
+    asyncio.run(scenario())
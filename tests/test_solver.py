@@ -0,0 +1,153 @@
+import copy
+import math
+import os
+import random
+from typing import Callable
+
+import networkx as nx
+import pytest
+
+from model import Track
+from reduction import expand_solution, reduce_network
+from sample import load_network
+from solver import SingleTrackOptimizerType, SingleTrackSolution, direct_link_tree, \
+    get_optimal_topology_for_a_single_track, get_optimal_topology_for_a_single_track_compact, \
+    get_optimal_topology_for_a_single_track_sparse, get_single_track_optimizer, hierarchical_tree, multicast_heuristic, \
+    prune_tree
+
+
+DATASOURCE = os.path.join(os.path.dirname(__file__), "..", "datasource")
+
+
+@pytest.fixture(scope="module")
+def network() -> nx.DiGraph:
+    return load_network(os.path.join(DATASOURCE, "azure_geant_topo.yaml"))
+
+
+# The used links have to form a tree rooted at the publisher that reaches every subscriber within the delay budget,
+# with only subscribers as its leaves, and with the cost and the max delay of the solution matching its links
+def assert_is_valid_topology(network: nx.DiGraph, track: Track, solution: SingleTrackSolution):
+    assert solution.success
+
+    tree = nx.DiGraph(solution.used_links)
+    tree.add_node(track.publisher)
+    assert nx.is_arborescence(tree)
+    assert tree.in_degree(track.publisher) == 0
+    assert track.subscribers <= set(tree.nodes)
+    assert all(node in track.subscribers for node in tree.nodes if tree.out_degree(node) == 0 and node != track.publisher)
+
+    latencies = nx.single_source_dijkstra_path_length(
+        tree, track.publisher, weight=lambda u, v, _: network.edges[u, v]["latency"])
+    assert max(latencies[subscriber] for subscriber in track.subscribers) <= track.delay_budget
+    assert math.isclose(solution.max_delay, max(latencies.values()))
+    assert math.isclose(solution.cost, sum(network.edges[link]["cost"] for link in solution.used_links))
+
+
+
+# The trees of the multicast heuristic on tracks where it has no ties to break, as found before its candidates were
+# looked up through the in-edges of the network index
+@pytest.mark.parametrize("peers, used_links", [
+    (["westeurope", "canadacentral", "uaenorth", "eastasia", "polandcentral", "francesouth", "uksouth"],
+     [("uksouth", "uaenorth"), ("westeurope", "canadacentral"), ("westeurope", "eastasia"),
+      ("westeurope", "francesouth"), ("westeurope", "polandcentral"), ("westeurope", "uksouth")]),
+    (["northeurope", "australiasoutheast", "israelcentral", "southafricanorth", "swedencentral", "japanwest", "ukwest"],
+     [("japanwest", "australiasoutheast"), ("northeurope", "israelcentral"), ("northeurope", "japanwest"),
+      ("northeurope", "southafricanorth"), ("northeurope", "swedencentral"), ("northeurope", "ukwest")]),
+])
+def test_multicast_heuristic_finds_the_same_tree(network: nx.DiGraph, peers: list[str],
+                                                 used_links: list[tuple[str, str]]):
+    track = Track(peers[0], peers[1:], 120)
+
+    solution = multicast_heuristic(network, track)
+    assert_is_valid_topology(network, track, solution)
+    assert sorted(solution.used_links) == used_links
+
+# Bypassing the relay next to the pruned subscriber leaves its (relay-only) parent without any children, so that gets
+# pruned as well, even though it's the next relay on the path to be tried
+def test_prune_tree_with_improve_skips_the_relays_that_are_already_pruned():
+    network = nx.DiGraph()
+    for node1, node2, cost in [("p", "a", 1.0), ("a", "b", 1.0), ("b", "s", 1.0), ("b", "x", 1.0), ("p", "s", 1.5)]:
+        network.add_edge(node1, node2, cost=cost, latency=1.0)
+
+    track = Track("p", ["s", "x"], 10)
+    solution = SingleTrackSolution.found(4.0, 3.0, [("p", "a"), ("a", "b"), ("b", "s"), ("b", "x")])
+
+    track.remove_subscriber("x")
+    solution = prune_tree(network, track, solution, "x", improve=True)
+
+    assert_is_valid_topology(network, track, solution)
+    assert solution.used_links == [("p", "s")]
+
+
+@pytest.mark.parametrize("improve", [False, True])
+def test_prune_tree_keeps_the_topology_valid(network: nx.DiGraph, improve: bool):
+    nodes = list(network.nodes)
+
+    for seed in range(50):
+        rnd = random.Random(seed)
+        peers = rnd.sample(nodes, 26)
+        track = Track(peers[0], peers[1:], 200)
+
+        solution = multicast_heuristic(network, track)
+        assert_is_valid_topology(network, track, solution)
+
+        for subscriber in rnd.sample(peers[1:], 12):
+            track.remove_subscriber(subscriber)
+            solution = prune_tree(network, track, solution, subscriber, improve=improve, improvement_depth=10)
+            assert_is_valid_topology(network, track, solution)
+
+
+# The direct links from the publisher are a poor backbone, which the clusters can improve on by relaying the content
+# among their own nodes
+def test_hierarchical_tree_improves_on_a_suboptimal_backbone(network: nx.DiGraph):
+    nodes = list(network.nodes)
+
+    for seed in range(3):
+        rnd = random.Random(seed)
+        peers = rnd.sample(nodes, 12)
+        track = Track(peers[0], peers[1:], 200)
+
+        backbone = direct_link_tree(network, track)
+        solution = hierarchical_tree(network, track, strategy=get_optimal_topology_for_a_single_track_sparse,
+                                     backbone_strategy=direct_link_tree, number_of_clusters=4, max_workers=1)
+        assert_is_valid_topology(network, track, solution)
+        assert solution.cost < backbone.cost
+
+
+# Solving must not add the other nodes of the network to the streams of the track, or a later solve on a smaller network
+# would look them up, and removing a subscriber would drop every stream
+def test_ilp_leaves_the_streams_of_the_track_alone(network: nx.DiGraph):
+    track = Track("westeurope", ["eastus", "japaneast", "brazilsouth"], 200)
+    streams = copy.deepcopy(track.streams)
+
+    solution = get_optimal_topology_for_a_single_track(network, track)
+    assert_is_valid_topology(network, track, solution)
+    assert track.streams == streams
+
+    smaller_network = network.copy()
+    smaller_network.remove_node("australiaeast")
+    assert get_optimal_topology_for_a_single_track_sparse(smaller_network, track).cost == solution.cost
+
+
+# The portfolio and the hierarchical optimizer solve ILPs themselves, which must not be nested in the ILP they warm start
+@pytest.mark.parametrize("warm_start", [SingleTrackOptimizerType.SPARSE_INTEGER_LINEAR_PROGRAMMING,
+                                        SingleTrackOptimizerType.PORTFOLIO, SingleTrackOptimizerType.HIERARCHICAL])
+def test_ilp_can_only_be_warm_started_by_a_heuristic(warm_start: SingleTrackOptimizerType):
+    with pytest.raises(ValueError):
+        get_single_track_optimizer(SingleTrackOptimizerType.INTEGER_LINEAR_PROGRAMMING, warm_start=warm_start)
+
+
+# The formulations of the ILP have the same optimum, also on the reduced network of the track (once expanded back)
+@pytest.mark.parametrize("ilp", [get_optimal_topology_for_a_single_track,
+                                 get_optimal_topology_for_a_single_track_compact,
+                                 get_optimal_topology_for_a_single_track_sparse])
+def test_ilps_find_the_same_optimum(network: nx.DiGraph, ilp: Callable[[nx.DiGraph, Track], SingleTrackSolution]):
+    track = Track("japaneast", ["australiacentral2", "switzerlandwest", "germanynorth"], 60)
+
+    solution = ilp(network, track)
+    assert_is_valid_topology(network, track, solution)
+    assert solution.cost == 129.0
+
+    solution = expand_solution(network, track, ilp(reduce_network(network, track), track))
+    assert_is_valid_topology(network, track, solution)
+    assert solution.cost == 129.0